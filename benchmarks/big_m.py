@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# LP relaxation and solve time of each linearization of z = x * w.
+#
+# For each synthetic instance (see formulations.py) and formulation, every
+# size from 2 to k* (the minimum number of paths, or the number of ground
+# truth paths for least squares) is built once per linearization. The LP
+# relaxation is solved first: for the feasibility models a stronger
+# relaxation proves more of the sizes below k* infeasible without
+# branching, and for least squares the gap between its objective and the
+# MIP objective is reported. The MIP is then solved as in the size search.
+#
+# python ./benchmarks/big_m.py -n 20 40 -w 2 4 -p 4 6 -o big_m.csv
+
+import os
+import sys
+import csv
+import time
+import argparse
+import random
+import gurobipy as gp
+from gurobipy import GRB
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from benchmarks.formulations import FORMULATIONS, layered_instance
+from robustfd.budget import set_time_budget
+from robustfd.ilp import LINEARIZATIONS
+from robustfd.stats import STATUSES, start_stats
+
+FIELDS = (
+    'nodes', 'width', 'paths', 'instance', 'edges', 'formulation', 'k', 'size', 'linearization',
+    'lp status', 'lp objective', 'lp time', 'status', 'objective', 'lp gap', 'nodes explored', 'solve time',
+)
+
+
+def solve_size(module, graph, size, time_budget):
+
+    data = module.compute_graph_metadata(graph)
+    data = set_time_budget(data, time_budget, None)
+    data = start_stats(data, graph, time.perf_counter())
+
+    # the relaxation of the model the size search would solve
+    model, _, _, _ = module.build_base_ilp_model(data, size)
+    relaxed = model.relax()
+    start = time.perf_counter()
+    relaxed.optimize()
+    lp = {
+        'lp status': STATUSES.get(relaxed.Status, relaxed.Status),
+        'lp objective': relaxed.ObjVal if relaxed.Status == GRB.OPTIMAL else None,
+        'lp time': time.perf_counter() - start,
+    }
+    relaxed.dispose()
+
+    module.fd_fixed_size(data, size)
+    solve = data['stats']['solves'][-1]
+    objective = model.ObjVal if model.SolCount > 0 else None
+    data['ilp']['model'].dispose()
+
+    gap = None
+    if lp['lp objective'] is not None and objective:
+        gap = (objective - lp['lp objective']) / abs(objective)
+
+    return dict(lp, **{
+        'status': solve['status'], 'objective': objective, 'lp gap': gap,
+        'nodes explored': solve['nodes'], 'solve time': solve['optimize time'],
+    })
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='''
+        Compares the linearizations of z = x * w on the LP relaxation and the solve time.
+        ''',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-n', '--nodes', type=int, nargs='+', default=[20, 40], help='Number of vertices of the graphs')
+    parser.add_argument('-w', '--width', type=int, nargs='+', default=[2, 4], help='Number of vertices per layer')
+    parser.add_argument('-p', '--paths', type=int, nargs='+', default=[4, 6], help='Number of ground truth paths')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Instances per family')
+    parser.add_argument('-e', '--epsilon', type=float, default=0.5, help='Epsilon of the Poisson perturbation')
+    parser.add_argument('-f', '--formulations', type=str, nargs='+', default=['exact', 'bounded', 'least_squares'], choices=FORMULATIONS, help='Formulations to run (default exact bounded least_squares)')
+    parser.add_argument('-lin', '--linearization', type=str, nargs='+', default=list(LINEARIZATIONS), choices=LINEARIZATIONS, help='Linearizations to compare (default all)')
+    parser.add_argument('-ilptb', '--ilp-time-budget', type=float, default=60, help='Time budget (in seconds) per size and linearization (default 60)')
+    parser.add_argument('-o', '--output', type=str, help='CSV file for the results table')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+
+    settings = {
+        'threads': 1,
+        'warm_start': False,
+        'builder': 'loop',
+        'symmetry': 'none',
+        'linearization': 'tight',
+        'contract': False,
+        'safe_paths': False,
+        'engine': 'ilp',
+        'size_search': 'linear',
+        'time_budget': args.ilp_time_budget,
+        'size_time_budget': None,
+    }
+    rng = random.Random(args.seed)
+
+    output = open(args.output, 'w', newline='') if args.output else None
+    writer = csv.DictWriter(output, FIELDS) if output else None
+    if writer:
+        writer.writeheader()
+
+    print(f'{"nodes":>6} {"width":>6} {"paths":>6} {"edges":>6} {"formulation":>14} {"k":>4} {"size":>5} {"linearization":>13} {"lp status":>11} {"lp gap":>8} {"status":>11} {"nodes":>8} {"solve (s)":>10}')
+    for nodes in args.nodes:
+        for width in args.width:
+            for paths in args.paths:
+                for instance in range(args.repeat):
+                    graphs = layered_instance(nodes, width, paths, args.epsilon, rng)
+                    for name in args.formulations:
+                        module, kind = FORMULATIONS[name]
+                        graph = graphs[kind]
+                        if name == 'least_squares':
+                            k = graphs['truth k']
+                        else:
+                            module.init_worker(settings)
+                            k = len((module.solve_graph(graph) or {}).get('weights', []))
+                        for size in range(2, k + 1):
+                            for option in args.linearization:
+                                module.init_worker(dict(settings, linearization=option))
+                                try:
+                                    row = solve_size(module, graph, size, args.ilp_time_budget)
+                                except (gp.GurobiError, IndexError) as e:
+                                    # the solve failed (e.g. a size-limited license) and was not recorded
+                                    print(f'Error: {e}', file=sys.stderr)
+                                    continue
+                                row.update({
+                                    'nodes': nodes, 'width': width, 'paths': paths, 'instance': instance,
+                                    'edges': len(graph['edges']), 'formulation': name, 'k': k, 'size': size,
+                                    'linearization': option,
+                                })
+                                if writer:
+                                    writer.writerow(row)
+                                    output.flush()
+                                gap = '' if row['lp gap'] is None else f'{row["lp gap"]:.4f}'
+                                print(f'{nodes:>6} {width:>6} {paths:>6} {row["edges"]:>6} {name:>14} {k:>4} {size:>5} {option:>13} {row["lp status"]:>11} {gap:>8} {row["status"]:>11} {row["nodes explored"]:>8} {row["solve time"]:>10.4f}')
+
+    if output:
+        output.close()
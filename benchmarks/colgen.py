@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Agreement and solve time of the column-generation engine against the ILP.
+#
+# Every synthetic instance (see formulations.py) is solved by the exact and
+# bounded-error models with each engine. Both must find the same minimum
+# number of paths; the table also reports the sizes the ILP size search still
+# had to solve (none when column generation proved its decomposition
+# optimal), the columns generated and the time of each engine. Rows where
+# the engines disagree are marked, and counted at the end; a run cut short by
+# the time budget is left out of the comparison.
+#
+# python ./benchmarks/colgen.py -n 10 20 -w 2 3 -p 3 5 -r 5 -o colgen.csv
+
+import os
+import sys
+import csv
+import time
+import argparse
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from benchmarks.formulations import FORMULATIONS, layered_instance
+from robustfd.colgen import ENGINES
+
+COMPARED = ('exact', 'bounded')
+
+FIELDS = (
+    'nodes', 'width', 'paths', 'instance', 'edges', 'formulation', 'engine',
+    'k', 'sizes tried', 'columns', 'lp solves', 'optimal', 'total time', 'timed out', 'agrees',
+)
+
+
+def run(module, graph, settings):
+
+    module.init_worker(settings)
+    start = time.perf_counter()
+    result = module.solve_graph(graph) or {}
+    total = time.perf_counter() - start
+    colgen = result.get('colgen', {})
+
+    return {
+        'k': len(result.get('weights', [])),
+        'sizes tried': ' '.join(str(size) for size in result.get('sizes tried', [])),
+        'columns': colgen.get('columns', 0),
+        'lp solves': colgen.get('iterations', 0),
+        'optimal': bool(colgen.get('optimal')),
+        'total time': total,
+        'timed out': bool(result.get('timed out')),
+    }
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='''
+        Checks the column-generation engine against the ILP on small synthetic DAGs.
+        ''',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-n', '--nodes', type=int, nargs='+', default=[10, 20], help='Number of vertices of the graphs')
+    parser.add_argument('-w', '--width', type=int, nargs='+', default=[2, 3], help='Number of vertices per layer')
+    parser.add_argument('-p', '--paths', type=int, nargs='+', default=[3, 5], help='Number of ground truth paths')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Instances per family')
+    parser.add_argument('-e', '--epsilon', type=float, default=0.5, help='Epsilon of the Poisson perturbation')
+    parser.add_argument('-f', '--formulations', type=str, nargs='+', default=list(COMPARED), choices=COMPARED, help='Formulations to run (default exact bounded)')
+    parser.add_argument('-ilptb', '--ilp-time-budget', type=float, default=60, help='Time budget (in seconds) per graph, formulation and engine (default 60)')
+    parser.add_argument('-o', '--output', type=str, help='CSV file for the results table')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+
+    settings = {
+        'threads': 1,
+        'warm_start': False,
+        'builder': 'loop',
+        'symmetry': 'none',
+        'linearization': 'tight',
+        'contract': False,
+        'safe_paths': False,
+        'engine': 'ilp',
+        'size_search': 'linear',
+        'time_budget': args.ilp_time_budget,
+        'size_time_budget': None,
+    }
+    rng = random.Random(args.seed)
+
+    output = open(args.output, 'w', newline='') if args.output else None
+    writer = csv.DictWriter(output, FIELDS) if output else None
+    if writer:
+        writer.writeheader()
+
+    runs, disagreements = 0, 0
+    print(f'{"nodes":>6} {"width":>6} {"paths":>6} {"edges":>6} {"formulation":>12} {"engine":>7} {"k":>4} {"sizes tried":>16} {"columns":>8} {"total (s)":>10}')
+    for nodes in args.nodes:
+        for width in args.width:
+            for paths in args.paths:
+                for instance in range(args.repeat):
+                    graphs = layered_instance(nodes, width, paths, args.epsilon, rng)
+                    for name in args.formulations:
+                        module, kind = FORMULATIONS[name]
+                        graph = graphs[kind]
+                        rows = {engine: run(module, graph, dict(settings, engine=engine)) for engine in ENGINES}
+                        agrees = len({row['k'] for row in rows.values() if not row['timed out']}) <= 1
+                        runs += 1
+                        disagreements += not agrees
+                        for engine, row in rows.items():
+                            row.update({
+                                'nodes': nodes, 'width': width, 'paths': paths, 'instance': instance,
+                                'edges': len(graph['edges']), 'formulation': name, 'engine': engine, 'agrees': agrees,
+                            })
+                            if writer:
+                                writer.writerow(row)
+                                output.flush()
+                            print(f'{nodes:>6} {width:>6} {paths:>6} {row["edges"]:>6} {name:>12} {engine:>7} {row["k"]:>4} {row["sizes tried"]:>16} {row["columns"]:>8} {row["total time"]:>10.4f}{" (timed out)" if row["timed out"] else ""}{"" if agrees else " (disagrees)"}')
+
+    if output:
+        output.close()
+
+    print(f'INFO: The engines agree on {runs - disagreements} of {runs} graphs')
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Build time, solve time, peak memory and number of paths of every
+# formulation on families of synthetic DAGs.
+#
+# Each instance superposes random source-to-sink paths over a layered DAG
+# (nodes vertices in layers of width vertices), perturbed as in
+# data_generator.py: the exact graph goes to mdf_standard, the sampled flows
+# to the bounded-error, least-squares and path-error models, and the
+# percentile ranges to the inexact model. Every run is made in a fresh
+# process so that its peak memory can be measured.
+#
+# python ./benchmarks/formulations.py -n 20 40 -w 2 4 -p 3 5 -o results.csv
+
+import os
+import sys
+import csv
+import time
+import argparse
+import random
+import resource
+from multiprocessing import Pool
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'previous_formulation'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data_generator'))
+import data_generator
+import imperfect_bounded
+import imperfect_inexact
+import imperfect_least_squares
+import imperfect_part_errors
+import mdf_standard
+from robustfd.ilp import BUILDERS
+from robustfd.size_search import STRATEGIES
+
+# formulation: (module, instance it is run on)
+FORMULATIONS = {
+    'exact': (mdf_standard, 'exact'),
+    'bounded': (imperfect_bounded, 'robust'),
+    'least_squares': (imperfect_least_squares, 'robust'),
+    'inexact': (imperfect_inexact, 'inexact'),
+    'path_errors': (imperfect_part_errors, 'robust'),
+}
+
+FIELDS = (
+    'nodes', 'width', 'paths', 'instance', 'edges', 'formulation', 'truth k', 'k', 'sizes tried',
+    'build time', 'solve time', 'total time', 'peak memory (MB)', 'timed out',
+)
+
+
+def layered_instance(nodes, width, paths, epsilon, rng):
+
+    # ground truth paths from 0 to nodes - 1, each visiting a random vertex of
+    # most layers, with weights in [1, 100]
+    inner = list(range(1, nodes - 1))
+    layers = [inner[i:i + width] for i in range(0, len(inner), width)]
+    truth = {'paths': list(), 'weights': list()}
+    for _ in range(paths):
+        route = [0] + [rng.choice(layer) for layer in layers if rng.random() < 0.8] + [nodes - 1]
+        truth['paths'].append(list(zip(route, route[1:])))
+        truth['weights'].append(float(rng.randint(1, 100)))
+
+    flow = dict()
+    for path, weight in zip(truth['paths'], truth['weights']):
+        for e in path:
+            flow[e] = flow.get(e, 0) + weight
+    exact = {'n': nodes, 'edges': [(u, v, f) for (u, v), f in flow.items()]}
+
+    # Poisson perturbation of data_generator.py
+    edges, flows = data_generator.edge_flows(exact, truth)
+    low, high = data_generator.flow_ranges(flows, epsilon)
+    weights = data_generator.sample_flows(flows, low, high, np.random.default_rng(rng.randrange(2 ** 32)))
+    robust = {'n': nodes, 'edges': [(u, v, w) for (u, v), w in zip(edges, weights.tolist())]}
+    inexact = {
+        'n': nodes,
+        'edges': [(u, v, (lo + hi) / 2) for (u, v), lo, hi in zip(edges, low.tolist(), high.tolist())],
+        'lower flow': [(u, v, lo) for (u, v), lo in zip(edges, low.tolist())],
+        'upper flow': [(u, v, hi) for (u, v), hi in zip(edges, high.tolist())],
+    }
+
+    return {'exact': exact, 'robust': robust, 'inexact': inexact, 'truth k': len(set(map(tuple, truth['paths'])))}
+
+
+def run(task):
+
+    name, graph, settings = task
+    module = FORMULATIONS[name][0]
+    module.init_worker(settings)
+
+    start = time.perf_counter()
+    result = module.solve_graph(graph) or {}
+    total = time.perf_counter() - start
+    solves = result.get('stats', {}).get('solves', [])
+
+    return {
+        'k': len(result.get('weights', [])),
+        'sizes tried': ' '.join(str(solve['size']) for solve in solves),
+        'build time': sum(solve['build time'] for solve in solves),
+        'solve time': sum(solve['optimize time'] for solve in solves),
+        'total time': total,
+        # ru_maxrss is in kilobytes on Linux
+        'peak memory (MB)': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'timed out': bool(result.get('timed out')),
+    }
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='''
+        Benchmarks every formulation on families of synthetic DAGs.
+        ''',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-n', '--nodes', type=int, nargs='+', default=[20, 40], help='Number of vertices of the graphs')
+    parser.add_argument('-w', '--width', type=int, nargs='+', default=[2, 4], help='Number of vertices per layer')
+    parser.add_argument('-p', '--paths', type=int, nargs='+', default=[3, 5], help='Number of ground truth paths')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Instances per family')
+    parser.add_argument('-e', '--epsilon', type=float, default=0.5, help='Epsilon of the Poisson perturbation')
+    parser.add_argument('-f', '--formulations', type=str, nargs='+', default=list(FORMULATIONS), choices=FORMULATIONS, help='Formulations to run (default all)')
+    parser.add_argument('-b', '--builder', type=str, default='loop', choices=BUILDERS, help='ILP builder (default loop)')
+    parser.add_argument('-s', '--size-search', type=str, default='linear', choices=STRATEGIES, help='Size search strategy (default linear)')
+    parser.add_argument('-ilptb', '--ilp-time-budget', type=float, default=60, help='Time budget (in seconds) per graph and formulation (default 60)')
+    parser.add_argument('-o', '--output', type=str, help='CSV file for the results table')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+
+    settings = {
+        'threads': 1,
+        'warm_start': False,
+        'builder': args.builder,
+        'symmetry': 'none',
+        'linearization': 'tight',
+        'contract': False,
+        'safe_paths': False,
+        'engine': 'ilp',
+        'size_search': args.size_search,
+        'time_budget': args.ilp_time_budget,
+        'size_time_budget': None,
+    }
+    rng = random.Random(args.seed)
+
+    output = open(args.output, 'w', newline='') if args.output else None
+    writer = csv.DictWriter(output, FIELDS) if output else None
+    if writer:
+        writer.writeheader()
+
+    print(f'{"nodes":>6} {"width":>6} {"paths":>6} {"edges":>6} {"formulation":>14} {"truth k":>8} {"k":>4} {"build (s)":>10} {"solve (s)":>10} {"total (s)":>10} {"mem (MB)":>9}')
+    for nodes in args.nodes:
+        for width in args.width:
+            for paths in args.paths:
+                for instance in range(args.repeat):
+                    graphs = layered_instance(nodes, width, paths, args.epsilon, rng)
+                    for name in args.formulations:
+                        # a fresh process per run, so that peak memory is its own
+                        with Pool(1, maxtasksperchild=1) as pool:
+                            row = pool.apply(run, ((name, graphs[FORMULATIONS[name][1]], settings),))
+                        row.update({
+                            'nodes': nodes, 'width': width, 'paths': paths, 'instance': instance,
+                            'edges': len(graphs['exact']['edges']), 'formulation': name, 'truth k': graphs['truth k'],
+                        })
+                        if writer:
+                            writer.writerow(row)
+                            output.flush()
+                        print(f'{nodes:>6} {width:>6} {paths:>6} {row["edges"]:>6} {name:>14} {row["truth k"]:>8} {row["k"]:>4} {row["build time"]:>10.4f} {row["solve time"]:>10.4f} {row["total time"]:>10.4f} {row["peak memory (MB)"]:>9.1f}{" (timed out)" if row["timed out"] else ""}')
+
+    if output:
+        output.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Build time of the loop and matrix ILP builders across graph sizes.
+#
+# python ./benchmarks/model_build.py -n 50 100 200 400 -k 5 10
+
+import os
+import sys
+import time
+import argparse
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'previous_formulation'))
+import mdf_standard
+
+
+def random_flow_graph(n, paths, rng):
+
+    # superposition of random source-to-sink paths over vertices 0..n-1,
+    # plus a backbone path so that every vertex is used
+    flow = {}
+    routes = [list(range(n))]
+    for _ in range(paths - 1):
+        route = [0] + sorted(rng.sample(range(1, n - 1), rng.randint(1, max(1, (n - 2) // 3)))) + [n - 1]
+        routes.append(route)
+    for route in routes:
+        weight = rng.randint(1, 100)
+        for u, v in zip(route, route[1:]):
+            flow[u, v] = flow.get((u, v), 0) + weight
+
+    return {'n': n, 'edges': [(u, v, float(f)) for (u, v), f in flow.items()]}
+
+
+def build_time(graph, size, builder):
+
+    mdf_standard.builder = builder
+    data = mdf_standard.compute_graph_metadata(graph)
+    start = time.perf_counter()
+    model, _, _, _ = mdf_standard.build_base_ilp_model(data, size)
+    model.update()
+    elapsed = time.perf_counter() - start
+    dimensions = model.NumVars, model.NumConstrs
+    model.dispose()
+
+    return (elapsed,) + dimensions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='''
+        Compares the time to build the exact MFD model with the loop and matrix builders.
+        ''',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-n', '--nodes', type=int, nargs='+', default=[50, 100, 200, 400], help='Graph sizes (number of vertices)')
+    parser.add_argument('-k', '--sizes', type=int, nargs='+', default=[5, 10], help='Number of paths of the model')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions per configuration; the best time is reported')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+
+    mdf_standard.threads = 1
+    mdf_standard.symmetry = 'none'
+    mdf_standard.linearization = 'tight'
+    rng = random.Random(args.seed)
+
+    print(f'{"nodes":>6} {"edges":>6} {"k":>4} {"vars":>8} {"constrs":>8} {"loop (s)":>10} {"matrix (s)":>10} {"speedup":>8}')
+    for n in args.nodes:
+        graph = random_flow_graph(n, max(args.sizes), rng)
+        for size in args.sizes:
+            loop = min(build_time(graph, size, 'loop')[0] for _ in range(args.repeat))
+            matrix, num_vars, num_constrs = min(build_time(graph, size, 'matrix') for _ in range(args.repeat))
+            print(f'{n:>6} {len(graph["edges"]):>6} {size:>4} {num_vars:>8} {num_constrs:>8} {loop:>10.4f} {matrix:>10.4f} {loop / matrix:>8.1f}')
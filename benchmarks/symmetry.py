@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Nodes explored and solve time of the infeasible sizes with each
+# symmetry-breaking option.
+#
+# The size search proves every size below the minimum k* infeasible, which
+# is where the k! interchangeable orderings of the path slots cost the most.
+# For each synthetic instance (see formulations.py) k* is found first, and
+# then every size from 2 to k* - 1 is solved on a fresh model with each
+# option. The least-squares model has no infeasible sizes and is left out.
+#
+# python ./benchmarks/symmetry.py -n 20 40 -w 2 4 -p 4 6 -o symmetry.csv
+
+import os
+import sys
+import csv
+import time
+import argparse
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from benchmarks.formulations import FORMULATIONS, layered_instance
+from robustfd.budget import set_time_budget
+from robustfd.ilp import SYMMETRY
+from robustfd.stats import start_stats
+
+SEARCHED = [name for name in FORMULATIONS if name != 'least_squares']
+
+FIELDS = ('nodes', 'width', 'paths', 'instance', 'edges', 'formulation', 'k', 'size', 'symmetry', 'status', 'nodes explored', 'solve time')
+
+
+def solve_size(module, graph, size, time_budget):
+
+    data = module.compute_graph_metadata(graph)
+    data = set_time_budget(data, time_budget, None)
+    data = start_stats(data, graph, time.perf_counter())
+    module.fd_fixed_size(data, size)
+    data['ilp']['model'].dispose()
+
+    return data['stats']['solves'][-1]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='''
+        Compares the symmetry-breaking options on the sizes the size search proves infeasible.
+        ''',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-n', '--nodes', type=int, nargs='+', default=[20, 40], help='Number of vertices of the graphs')
+    parser.add_argument('-w', '--width', type=int, nargs='+', default=[2, 4], help='Number of vertices per layer')
+    parser.add_argument('-p', '--paths', type=int, nargs='+', default=[4, 6], help='Number of ground truth paths')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Instances per family')
+    parser.add_argument('-e', '--epsilon', type=float, default=0.5, help='Epsilon of the Poisson perturbation')
+    parser.add_argument('-f', '--formulations', type=str, nargs='+', default=['exact', 'bounded'], choices=SEARCHED, help='Formulations to run (default exact bounded)')
+    parser.add_argument('-sb', '--symmetry-breaking', type=str, nargs='+', default=list(SYMMETRY), choices=SYMMETRY, help='Options to compare (default all)')
+    parser.add_argument('-ilptb', '--ilp-time-budget', type=float, default=60, help='Time budget (in seconds) per size and option (default 60)')
+    parser.add_argument('-o', '--output', type=str, help='CSV file for the results table')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+
+    settings = {
+        'threads': 1,
+        'warm_start': False,
+        'builder': 'loop',
+        'symmetry': 'none',
+        'linearization': 'tight',
+        'contract': False,
+        'safe_paths': False,
+        'engine': 'ilp',
+        'size_search': 'linear',
+        'time_budget': args.ilp_time_budget,
+        'size_time_budget': None,
+    }
+    rng = random.Random(args.seed)
+
+    output = open(args.output, 'w', newline='') if args.output else None
+    writer = csv.DictWriter(output, FIELDS) if output else None
+    if writer:
+        writer.writeheader()
+
+    print(f'{"nodes":>6} {"width":>6} {"paths":>6} {"edges":>6} {"formulation":>14} {"k":>4} {"size":>5}' + ''.join(f' {option + " nodes":>15} {option + " (s)":>12}' for option in args.symmetry_breaking))
+    for nodes in args.nodes:
+        for width in args.width:
+            for paths in args.paths:
+                for instance in range(args.repeat):
+                    graphs = layered_instance(nodes, width, paths, args.epsilon, rng)
+                    for name in args.formulations:
+                        module, kind = FORMULATIONS[name]
+                        graph = graphs[kind]
+                        module.init_worker(settings)
+                        result = module.solve_graph(graph) or {}
+                        k = len(result.get('weights', []))
+                        for size in range(2, k):
+                            line = f'{nodes:>6} {width:>6} {paths:>6} {len(graph["edges"]):>6} {name:>14} {k:>4} {size:>5}'
+                            for option in args.symmetry_breaking:
+                                module.init_worker(dict(settings, symmetry=option))
+                                solve = solve_size(module, graph, size, args.ilp_time_budget)
+                                line += f' {solve["nodes"]:>15} {solve["optimize time"]:>12.4f}'
+                                if writer:
+                                    writer.writerow({
+                                        'nodes': nodes, 'width': width, 'paths': paths, 'instance': instance,
+                                        'edges': len(graph['edges']), 'formulation': name, 'k': k, 'size': size,
+                                        'symmetry': option, 'status': solve['status'],
+                                        'nodes explored': solve['nodes'], 'solve time': solve['optimize time'],
+                                    })
+                                    output.flush()
+                            print(line)
+
+    if output:
+        output.close()
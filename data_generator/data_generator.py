@@ -13,6 +13,11 @@ from collections import deque
 from bisect import bisect
 from copy import deepcopy
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from robustfd.graph_batch import batch_paths, is_batch, iter_batch, load_batch
+from robustfd.graph_io import read_blocks
+from robustfd.parallel import solve_in_order
+
 
 class TimeoutILP(Exception):
     pass
@@ -76,21 +81,32 @@ def get_path(raw_path):
 
 def read_input_graphs(graph_file):
 
-    graphs_raw = open(graph_file, 'r').read().split('#')[1:]
-
-    return [get_graph(raw_g) for raw_g in graphs_raw]
+    return (get_graph(raw_g) for raw_g in read_blocks(graph_file))
 
 def read_input_ground_truth(ground_file):
 
-    paths_raw = open(ground_file, 'r').read().split('#')[1:]
-    
-    return [get_path(raw_g) for raw_g in paths_raw]
+    return (get_path(raw_g) for raw_g in read_blocks(ground_file))
+
+def get_path_from_batch(weighted_paths):
+
+    return {
+        'n': len(weighted_paths),
+        'paths': [list(zip(vertices, vertices[1:])) for _, vertices in weighted_paths],
+        'weights': [float(weight) for weight, _ in weighted_paths]
+    }
 
 def read_input_graph(graph_file):
 
+    if is_batch(graph_file):
+        return iter_batch(load_batch(graph_file))
+
     return read_input_graphs(graph_file)
 
 def read_input_paths(ground_file):
+
+    if is_batch(ground_file):
+        return (get_path_from_batch(paths) for paths in iter_batch(load_batch(ground_file), batch_paths))
+
     return read_input_ground_truth(ground_file)
 
 
@@ -127,57 +143,88 @@ def compute_graph_metadata(graph):
         'max_flow_value': max(ngraph.edges(data='flow'), key=lambda e: e[-1])[-1] if len(ngraph.edges) > 0 else -1,
     }
 
-def building_solutions(graphs,paths,robust_file,inexact_file, epsilon,output_stats=False):
+def edge_flows(graph, truth):
 
-    robust = open(robust_file, 'w+')
-    inexact = open(inexact_file,'w+')
+    # superposition of the ground truth on the distinct edges of the graph
+    # (in input order), accumulated in one pass over the path edges
+    index = dict()
+    for (u, v, _) in graph['edges']:
+        index.setdefault((u, v), len(index))
 
-    for i in range(0,len(graphs)):
-        edges_from_graph = set()
-        edges = graphs[i]['edges']
-        for (u,v,k) in edges:
-            edges_from_graph.add((u,v,))
-        
-        path = paths[i]['paths']
-        weight = paths[i]['weights']
-        N = graphs[i]['n']
+    positions = [index[e] for path in truth['paths'] for e in path if e in index]
+    weights = [w for path, w in zip(truth['paths'], truth['weights']) for e in path if e in index]
+    flows = np.bincount(np.asarray(positions, dtype=np.int64), weights=weights, minlength=len(index)) if positions else np.zeros(len(index))
 
-        robust.write(f'# graph {i}\n')
-        robust.write(''.join(str(N)))
-        robust.write('\n')
+    return list(index), flows
 
-        inexact.write(f'# graph {i}\n')
-        inexact.write(''.join(str(N)))
-        inexact.write('\n')
+def flow_ranges(flows, epsilon):
 
-        f = {}
+    # the integers between the 0.5 -+ epsilon/2 percentiles of Poisson(f),
+    # as [low, high]; edges where that range is empty (or only 0) keep f
+    low = poisson.ppf(0.5 - epsilon/2, flows)
+    high = poisson.ppf(0.5 + epsilon/2, flows) - 1
+    empty = ~(high >= np.maximum(low, 1))
+    low[empty] = flows[empty]
+    high[empty] = flows[empty]
 
-        
-        for (u,v) in edges_from_graph:
-            f[u,v] = 0
-            for k in range(0,len(path)):
-                if (u,v) in path[k]:
-                    f[u,v] += weight[k]
-        
+    return low, high
+
+def sample_flows(flows, low, high, rng):
+
+    # Poisson(f) truncated to [low, high], by inverse transform sampling
+    # between the cdf values at the ends of the range
+    bottom = poisson.cdf(low - 1, flows)
+    top = poisson.cdf(high, flows)
+    samples = np.clip(poisson.ppf(rng.uniform(bottom, top), flows), low, high)
+    samples = np.where(low == high, low, samples)
+
+    return np.maximum(1.0, samples)
+
+def epsilon_filename(filename, epsilon, epsilons):
+
+    # one output per epsilon: {epsilon} in the name is replaced, otherwise
+    # the epsilon is appended to the name when there are several
+    if '{epsilon}' in filename:
+        return filename.replace('{epsilon}', str(epsilon))
+    if len(epsilons) == 1:
+        return filename
+    root, extension = os.path.splitext(filename)
+    return f'{root}_{epsilon}{extension}'
+
+def perturb_graph(task):
+
+    # the edge flows are computed once and perturbed for every epsilon; each
+    # graph has its own random stream so that results do not depend on -w
+    i, graph, truth, epsilons, seed = task
+    N = graph['n']
+    edges, flows = edge_flows(graph, truth)
+    rng = np.random.default_rng(None if seed is None else [seed, i])
+
+    outputs = list()
+    for epsilon in epsilons:
+        low, high = flow_ranges(flows, epsilon)
+        weights = sample_flows(flows, low, high, rng)
+        robust = ''.join(f'{u} {v} {w}\n' for (u, v), w in zip(edges, weights.tolist()))
+        inexact = ''.join(f'{u} {v} {lo} {hi}\n' for (u, v), lo, hi in zip(edges, low.tolist(), high.tolist()))
+        outputs.append((f'# graph {i}\n{N}\n{robust}', f'# graph {i}\n{N}\n{inexact}'))
 
-            flow_range = np.arange(poisson.ppf(0.5 - epsilon/2,f[u,v]),poisson.ppf(0.5 + epsilon/2,f[u,v]))
+    return outputs
 
-            if flow_range.any() == False:
-                flow_range = [f[u,v]]
+def building_solutions(graphs,paths,robust_file,inexact_file, epsilons,output_stats=False,seed=None,workers=1):
 
-            flow_range_max = max(flow_range)
-            flow_range_min = min(flow_range)
-            
-            inexact.write(' '.join([str(u),str(v),str(flow_range_min),str(flow_range_max)]))
-            inexact.write('\n')
+    robust = [open(epsilon_filename(robust_file, epsilon, epsilons), 'w+') for epsilon in epsilons]
+    inexact = [open(epsilon_filename(inexact_file, epsilon, epsilons), 'w+') for epsilon in epsilons]
 
-            distribution = poisson.pmf(flow_range,f[u,v])
-            distribution = [value/np.sum(distribution) for value in distribution]
+    # graphs and ground truths are read in lock-step, one graph at a time,
+    # and every epsilon is written in the same pass
+    tasks = ((i, graph, truth, epsilons, seed) for i, (graph, truth) in enumerate(zip(graphs, paths)))
+    for outputs in solve_in_order(perturb_graph, tasks, workers):
+        for e, (robust_text, inexact_text) in enumerate(outputs):
+            robust[e].write(robust_text)
+            inexact[e].write(inexact_text)
 
-            newWeight = max(1.0,np.random.choice(flow_range,p=distribution,size=1)[0])
-            
-            robust.write(' '.join([str(u),str(v),str(newWeight)]))
-            robust.write('\n')
+    for output in robust + inexact:
+        output.close()
     
     return 0
     
@@ -198,15 +245,18 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--threads', type=int, default=0,
                         help='Number of threads to use for the Gurobi solver; use 0 for all threads (default 0).')
     parser.add_argument('-ilptb', '--ilp-time-budget', type=float, help='Maximum time (in seconds) that the ilp solver is allowed to take when computing safe paths for one graph')
+    parser.add_argument('-s', '--seed', type=int, help='Seed of the random generator, for reproducible datasets.')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of worker processes perturbing graphs in parallel; use 0 for one per core (default 1).')
 
     
  
     requiredNamed = parser.add_argument_group('required arguments')
     requiredNamed.add_argument('-i', '--input', type=str, help='Exact graph filename', required=True)
     requiredNamed.add_argument('-g', '--ground', type=str, help='Exact ground truth filename', required=True)
-    requiredNamed.add_argument('-r', '--robust', type=str, help='Robust ground truth filename', required=True)
-    requiredNamed.add_argument('-x', '--inexact', type=str, help='Inexafct ground truth filename', required=True)
-    requiredNamed.add_argument('-e', '--epsilon', type=float,help='Epsilon precision',required=True)
+    requiredNamed.add_argument('-r', '--robust', type=str, help='Robust ground truth filename; {epsilon} in it is replaced by each epsilon,\notherwise _<epsilon> is added before the extension when there are several', required=True)
+    requiredNamed.add_argument('-x', '--inexact', type=str, help='Inexafct ground truth filename, named as with -r', required=True)
+    requiredNamed.add_argument('-e', '--epsilon', type=float, nargs='+', help='Epsilon precision; several values write one robust and inexact\nfile each (see -r and -x), from a single pass over the inputs',required=True)
 
     args = parser.parse_args()
 
@@ -218,4 +268,7 @@ if __name__ == '__main__':
     ilp_counter = 0
     ilp_time_budget = args.ilp_time_budget
     time_budget = args.ilp_time_budget
-    building_solutions(read_input_graph(args.input),read_input_paths(args.ground),args.robust,args.inexact,args.epsilon, args.output_stats)
+    workers = args.workers
+    if workers == 0:
+        workers = os.cpu_count()
+    building_solutions(read_input_graph(args.input),read_input_paths(args.ground),args.robust,args.inexact,args.epsilon, args.output_stats, args.seed, workers)
@@ -1,10 +1,14 @@
 import os
 import sys
+import json
 import argparse
-import networkx as nx
 from collections import deque
+from itertools import zip_longest
 from bisect import bisect
 from copy import deepcopy
+from robustfd.graph_batch import batch_paths, is_batch, iter_batch, load_batch
+from robustfd.graph_io import read_blocks, read_path
+from robustfd.parallel import solve_in_order
 
 def get_ground_truth(raw_graph):
 
@@ -26,10 +30,12 @@ def get_ground_truth(raw_graph):
         nodes = set()
         n = 0
 
-        for i in range(0,len(lines)-1):
+        for line in lines:
 
-            weights = int(lines[i].split(" ")[0])
-            paths = [int(i) for i in lines[i].split(" ")[1:-1]]
+            # same parsing as the batches of robustfd.graph_batch
+            if not line.strip():
+                continue
+            weights, paths = read_path(line)
             edges = list(zip(paths,paths[1:]))
 
             paths_list.append(paths)
@@ -45,11 +51,27 @@ def get_ground_truth(raw_graph):
     finally:
         return graph
 
+def get_ground_truth_from_batch(weighted_paths):
+
+    nodes = set()
+    for _, vertices in weighted_paths:
+        nodes.update(vertices)
+
+    return {
+        'n': len(nodes),
+        'edges': [list(zip(vertices, vertices[1:])) for _, vertices in weighted_paths],
+        'paths': [vertices for _, vertices in weighted_paths],
+        'weights': [weight for weight, _ in weighted_paths]
+    }
+
 def read_graph_solution(ground_truth_file):
+
+    # binary batches (see robustfd.graph_batch) are memory-mapped instead of parsed
+    if is_batch(ground_truth_file):
+        return (get_ground_truth_from_batch(paths) for paths in iter_batch(load_batch(ground_truth_file), batch_paths))
     
-    graphs_raw = open(ground_truth_file, 'r').read().split('#')[1:]
-    
-    return [get_ground_truth(raw_g) for raw_g in graphs_raw]
+    # solutions are parsed one graph at a time, as they are compared
+    return (get_ground_truth(raw_g) for raw_g in read_blocks(ground_truth_file))
 
 def compareNumberOfPaths(truth_paths,solutions_paths):
 
@@ -70,20 +92,13 @@ def comparePath(ground,solution):
 
 def compareSequenceOfEdges(truth_edges,solutions_edges):
 
+    # every ground truth path is found among the solution paths, looked up
+    # by hashing each path as a tuple of its edges
     if len(truth_edges) != len(solutions_edges):
         return 0
-    
-    else:
-        for ground_path in truth_edges:
-            counter = 0
-            for solution_path in solutions_edges:
-                if comparePath(ground_path,solution_path):
-                    counter = 1
-                if counter ==1 :
-                    break
-            if counter == 0:
-                return 0 
-        return 1
+
+    solution_paths = set(map(tuple, solutions_edges))
+    return int(all(tuple(path) in solution_paths for path in truth_edges))
     
 def compareWeights(truth_weight,solution_weight):
     if truth_weight == solution_weight:
@@ -101,18 +116,19 @@ def compareSequenceOfEdgesandWeights(ground,solution):
     if (len(groundWeights) != len(solutionWeights)) and (len(groundEdges) != len(solutionEdges)):
         return 0
 
-    else:
-        
-        for k in range(0,len(groundWeights)):
-            counter = 0
-            for k1 in range(0,len(solutionWeights)):
-                if (comparePath(solutionEdges[k1],groundEdges[k]) and compareWeights(groundWeights[k],solutionWeights[k1])):
-                    counter = 1
-                if counter == 1:
-                    break
-            if counter == 0:
-                return 0
-        return 1
+    # every ground truth (path, weight) pair is found among the solution pairs
+    solution_pairs = set(zip(map(tuple, solutionEdges), solutionWeights))
+    return int(all(pair in solution_pairs for pair in zip(map(tuple, groundEdges), groundWeights)))
+
+def superposition(edges, weights):
+
+    # total weight of the paths through each edge, sorted by edge
+    flow = {}
+    for path, weight in zip(edges, weights):
+        for e in path:
+            flow[e] = flow.get(e, 0) + weight
+
+    return sorted(flow.items())
 
 def compareSuperposition(ground,solution):
 
@@ -124,89 +140,120 @@ def compareSuperposition(ground,solution):
     if (len(groundWeights) != len(solutionWeights)) and (len(groundEdges) != len(solutionEdges)):
         return 0
 
-    else:
+    truth_flow = superposition(groundEdges, groundWeights)
+    solution_flow = superposition(solutionEdges, solutionWeights)
 
-        # building truth graph using networkx
-        truthGraph = nx.DiGraph()
-        for i in range(0,len(groundWeights)):
-            for (u,v) in groundEdges[i]:
-                if truthGraph.has_edge(u,v) == True:
-                    truthGraph[u][v]['weight'] += groundWeights[i]
-                else:
-                    truthGraph.add_edge(u,v,weight=groundWeights[i])
-
-        # building truth graph using networkx
-        solutionGraph = nx.DiGraph()
-        for i in range(0,len(solutionWeights)):
-            for (u,v) in solutionEdges[i]:
-                if solutionGraph.has_edge(u,v) == True:
-                    solutionGraph[u][v]['weight'] += solutionWeights[i]
-                else:
-                    solutionGraph.add_edge(u,v,weight=solutionWeights[i])
-
-        # compare metadat from truth and solution
-        truthEdgeData = sorted(list(truthGraph.edges.data()))
-        solutionEdgeData = sorted(list(solutionGraph.edges.data()))
-
-        for i in range(0,len(truthEdgeData)):
-            if truthEdgeData[i] != solutionEdgeData[i]:
-                return 0
+    # the edges of the truth are compared, in order, with the first edges of
+    # the solution; a solution with fewer edges cannot match
+    if len(solution_flow) < len(truth_flow):
+        return 0
 
-        return 1
+    return int(solution_flow[:len(truth_flow)] == truth_flow)
+
+def compare_graph(base,member):
+
+    # for all metrics: 1: sucess 0: failure; a graph missing from the
+    # solutions fails them all
+    if member is None:
+        return {'number of paths': 0, 'M1': 0, 'M2': 0, 'M3': 0}
 
-def compare_instances(grounds,solutions,output_file, output_stats=False):
+    return {
+        # extra metrics - number of Paths
+        'number of paths': compareNumberOfPaths(base['paths'],member['paths']),
+        # compare M1 = superposition rule
+        'M1': compareSuperposition(base,member),
+        # compare M2 = path rule
+        'M2': compareSequenceOfEdges(base['edges'],member['edges']),
+        # compare M3 = path and weight rule
+        'M3': compareSequenceOfEdgesandWeights(base,member),
+    }
 
-    Mextra = [0]*len(grounds)
-    M1 = [0]*len(grounds)
-    M2 = [0]*len(grounds)
-    M3 = [0]*len(grounds)
+def compare_chunk(chunk):
 
-    for k in range(0,len(grounds)):
-        print("New graph",k)
-        base = grounds[k]
-        member = solutions[k]  
+    # chunk is a list of (k, ground truth, solution); the size and number of
+    # paths of the ground truth are kept for the summary
+    return [(k, base['n'], len(base['paths']), compare_graph(base, member)) for k, base, member in chunk]
 
-        # for all metrics: 1: sucess 0: failure
+def chunks(grounds, solutions, chunk_size, missing):
 
-        # extra metrics - number of Paths
-        Mextra[k] = compareNumberOfPaths(base['paths'],member['paths'])
+    # a solution file shorter than the ground truth has its missing graphs
+    # counted in missing; a longer one cannot be evaluated
+    chunk = list()
+    for k, (base, member) in enumerate(zip_longest(grounds, solutions)):
+        if base is None:
+            raise ValueError(f'graph {k} of the solutions has no ground truth')
+        if member is None:
+            missing['graphs'] += 1
+        chunk.append((k, base, member))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = list()
+    if chunk:
+        yield chunk
 
-        
-        # compare M1 = superposition rule
-        M1[k] = compareSuperposition(base,member)
+def add_to_summary(summary, n, paths, metrics):
 
-        # compare M1 = path rule
-        M2[k] = compareSequenceOfEdges(base['edges'],member['edges'])
+    # running sums of each metric, overall and per number of paths and graph size
+    for group in (summary['all'], summary['by paths'].setdefault(paths, {}), summary['by size'].setdefault(n, {})):
+        group['graphs'] = group.get('graphs', 0) + 1
+        for metric, value in metrics.items():
+            group[metric] = group.get(metric, 0) + value
 
-        # compare M2 = path and weight rule
-        M3[k] = compareSequenceOfEdgesandWeights(base,member)
+def accuracy(group):
 
-        print(k,Mextra[k],M1[k],M2[k],M3[k])
-   
-    
-    output = open(output_file, 'w+')
-    
-    metrics = {
-        'M1': M1,
-        'M2': M2,
-        'M3': M3,
-        'Mextra': Mextra
+    return {'graphs': group.get('graphs', 0), **{metric: value / group['graphs'] for metric, value in group.items() if metric != 'graphs'}}
+
+def output_summary(summary, summary_file):
+
+    report = {
+        'all': accuracy(summary['all']),
+        'by paths': {paths: accuracy(group) for paths, group in sorted(summary['by paths'].items())},
+        'by size': {n: accuracy(group) for n, group in sorted(summary['by size'].items())},
     }
+    with open(summary_file, 'w') as output:
+        json.dump(report, output, indent=1)
+
+    return report
 
-    outputMetrics(output,metrics,len(grounds))
+def compare_instances(grounds,solutions,output_file, output_stats=False, workers=1, chunk_size=1000, verbose=False):
+
+    output = open(output_file, 'w+')
+    summary = {'all': {}, 'by paths': {}, 'by size': {}}
+    missing = {'graphs': 0}
+
+    # both files are walked in lock-step, in chunks of graphs that may be
+    # compared in worker processes, and written back in order
+    for results in solve_in_order(compare_chunk, chunks(grounds, solutions, chunk_size, missing), workers):
+        for k, n, paths, metrics in results:
+            if verbose:
+                print(k,metrics['number of paths'],metrics['M1'],metrics['M2'],metrics['M3'])
+
+            outputMetric(output,k,metrics['M1'],metrics['M2'],metrics['M3'])
+            add_to_summary(summary, n, paths, metrics)
+
+    output.close()
+
+    report = output_summary(summary, output_file + '.summary')
+    if missing['graphs']:
+        print(f"INFO: {missing['graphs']} graphs of the ground truth have no solution and count as failures")
+    if report['all']['graphs'] > 0:
+        overall = report['all']
+        print(f"INFO: {overall['graphs']} graphs, accuracy M1 {overall['M1']:.4f}, M2 {overall['M2']:.4f}, M3 {overall['M3']:.4f}, number of paths {overall['number of paths']:.4f}")
+
+    return 0
+
+def outputMetric(output,k,M1,M2,M3):
+
+    output.write(f'# graph {k}\n')
+    output.write(f'{M1} {M2} {M3}')
+    output.write('\n')
 
     return 0
 
 def outputMetrics(output,metrics,K):
 
     for k in range(0,K):
-        
-        output.write(f'# graph {k}\n')
-        M1 = metrics['M1'][k]
-        M2 = metrics['M2'][k]
-        M3 = metrics['M3'][k]
-        output.write(f'{M1} {M2} {M3}')
-        output.write('\n')
+        outputMetric(output,k,metrics['M1'][k],metrics['M2'][k],metrics['M3'][k])
 
     return 0
 
@@ -219,11 +266,21 @@ if __name__ == '__main__':
         formatter_class=argparse.RawTextHelpFormatter
     )
  
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of worker processes comparing chunks of graphs in parallel; use 0 for one per core (default 1).')
+    parser.add_argument('-cs', '--chunk-size', type=int, default=1000,
+                        help='Number of graphs sent to a worker at a time (default 1000).')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Print the metrics of every graph.')
+ 
     requiredNamed = parser.add_argument_group('required arguments')
     requiredNamed.add_argument('-i', '--input', type=str, help='Input filename', required=True)
-    requiredNamed.add_argument('-o', '--output',type=str, help='Output filename', required=True)
+    requiredNamed.add_argument('-o', '--output',type=str, help='Output filename; accuracies are summarised in <output>.summary', required=True)
     requiredNamed.add_argument('-p', '--compare',type=str,help='Comparative filename', required=True)
     args = parser.parse_args()
 
 
-    compare_instances(read_graph_solution(args.input),read_graph_solution(args.compare))
+    workers = args.workers
+    if workers == 0:
+        workers = os.cpu_count()
+    compare_instances(read_graph_solution(args.input),read_graph_solution(args.compare),args.output, workers=workers, chunk_size=args.chunk_size, verbose=args.verbose)
@@ -1,7 +1,69 @@
 import os
 import sys
 import argparse
-import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'previous_formulation'))
+import imperfect_bounded
+import imperfect_inexact
+import imperfect_least_squares
+import imperfect_part_errors
+from robustfd.components import solve_graph_components
+from robustfd.parallel import solve_in_order, worker_threads
+from robustfd.size_search import STRATEGIES
+
+# formulation: (module, input format it reads, output file)
+FORMULATIONS = {
+    'bounded': (imperfect_bounded, 'robust', 'bounded.out'),
+    'least_squares': (imperfect_least_squares, 'robust', 'least_squares.out'),
+    'inexact': (imperfect_inexact, 'inexact', 'inexact.out'),
+    'path_errors': (imperfect_part_errors, 'robust', 'path_errors.out'),
+}
+
+
+def init_formulations(settings):
+
+    # every formulation reads its solver settings from module globals
+    for module, _, _ in FORMULATIONS.values():
+        module.init_worker(settings)
+
+
+def formulation_tasks(inputs, selected):
+
+    # each graph is parsed once and handed to every formulation reading its format
+    for kind, graphs in inputs.items():
+        names = [name for name in selected if FORMULATIONS[name][1] == kind]
+        if not names:
+            continue
+        for g, graph in enumerate(graphs):
+            for name in names:
+                yield name, g, graph
+
+
+def solve_formulation(task):
+
+    name, g, graph = task
+    return name, g, solve_graph_components(FORMULATIONS[name][0].solve_graph, graph)
+
+
+def solve_formulations(inputs, selected, output_dir, settings, workers):
+
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {name: open(os.path.join(output_dir, FORMULATIONS[name][2]), 'w+') for name in selected}
+
+    # without a pool the formulations run in this process
+    init_formulations(settings)
+
+    tasks = formulation_tasks(inputs, selected)
+    for name, g, result in solve_in_order(solve_formulation, tasks, workers, init_formulations, (settings,)):
+        output = outputs[name]
+        output.write(f'# graph {g}\n')
+        if result is not None:
+            FORMULATIONS[name][0].output_paths(output, result['solution'], result['weights'])
+
+    for name, output in outputs.items():
+        output.close()
+        print(f'INFO: {name} decompositions written to {output.name}')
+
 
 if __name__ == '__main__':
 
@@ -14,30 +76,55 @@ if __name__ == '__main__':
     )
     parser.add_argument('-t', '--threads', type=int, default=0,
                         help='Number of threads to use for the Gurobi solver; use 0 for all threads (default 0).')
+    parser.add_argument('-w', '--workers', type=int, default=0,
+                        help='Number of worker processes solving graphs of all formulations in parallel; use 0 for one per core (default 0).\nThe Gurobi threads are split among the workers.')
+    parser.add_argument('-f', '--formulations', type=str, nargs='+', default=list(FORMULATIONS), choices=FORMULATIONS,
+                        help='Formulations to run (default all):\n   bounded, least_squares and path_errors read the robust input,\n   inexact reads the inexact input.')
+    parser.add_argument('-od', '--output-dir', type=str, default='./example_outputs',
+                        help='Directory where <formulation>.out is written for each formulation (default ./example_outputs).')
+    parser.add_argument('-s', '--size-search', type=str, default='linear', choices=STRATEGIES,
+                        help='Strategy used to search for the minimum number of paths (default linear).')
+    parser.add_argument('-ilptb', '--ilp-time-budget', type=float,
+                        help='Maximum time (in seconds) for all the ILP solves of one graph in one formulation.')
 
-    requiredNamed = parser.add_argument_group('required arguments')
-    requiredNamed.add_argument('-ie', '--input', type=str, help='Input filename', required=True)
-    requiredNamed.add_argument('-ii', '--input2', type=str, help='Input filename', required=True)
+    requiredNamed = parser.add_argument_group('input arguments')
+    requiredNamed.add_argument('-ie', '--input', type=str, help='Input filename in the robust format')
+    requiredNamed.add_argument('-ii', '--input2', type=str, help='Input filename in the inexact format')
 
     args = parser.parse_args()
 
+    selected = list(dict.fromkeys(args.formulations))
+    files = {'robust': args.input, 'inexact': args.input2}
+    for name in selected:
+        kind = FORMULATIONS[name][1]
+        if files[kind] is None:
+            parser.error(f'{name} needs the {kind} input ({"-ie" if kind == "robust" else "-ii"})')
+
     threads = args.threads
     if threads == 0:
         threads = os.cpu_count()
+    workers = args.workers
+    if workers == 0:
+        workers = os.cpu_count()
+    threads = worker_threads(threads, workers)
+    if workers > 1:
+        print(f'INFO: Using {workers} worker processes')
     print(f'INFO: Using {threads} threads for the Gurobi solver')
 
-    # call bounded
-    bounded_command = ''.join(['python ./previous_formulation/imperfect_bounded.py -i ',str(args.input),' -o ./example_outputs/bounded.out'])
-    subprocess.call(bounded_command, shell=True)
-
-    # call least squares
-    least_squares_command = ''.join(['python ./previous_formulation/imperfect_least_squares.py -i ',str(args.input),' -o ./example_outputs/least_squares.out'])
-    subprocess.call(least_squares_command, shell=True)
-
-    # call robust
-    robust_command = ''.join(['python ./previous_formulation/imperfect_inexact.py -i ',str(args.input),' -o ./example_outputs/inexact.out'])
-    subprocess.call(robust_command, shell=True)
-    
-    # call inexact
-    robust_command = ''.join(['python ./imperfect_path_errors.py -i ',str(args.input2),'  -o ./example_outputs/path_erros.out'])
-    subprocess.call(robust_command, shell=True)
+    settings = {
+        'threads': threads,
+        'warm_start': False,
+        'builder': 'loop',
+        'symmetry': 'none',
+        'linearization': 'tight',
+        'contract': False,
+        'safe_paths': False,
+        'engine': 'ilp',
+        'size_search': args.size_search,
+        'time_budget': args.ilp_time_budget,
+        'size_time_budget': None,
+    }
+    readers = {'robust': imperfect_bounded.read_input, 'inexact': imperfect_inexact.read_input}
+    inputs = {kind: readers[kind](filename) for kind, filename in files.items() if filename is not None}
+
+    solve_formulations(inputs, selected, args.output_dir, settings, workers)
@@ -3,14 +3,29 @@
 
 import os
 import sys
+import time
 import argparse
-import networkx as nx
 import gurobipy as gp
 from gurobipy import GRB
 from collections import deque
 from bisect import bisect
 from copy import deepcopy
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from robustfd.bounds import size_bounds
+from robustfd.budget import set_time_budget
+from robustfd.cache import cache_lookups, cache_store, close_cache, open_cache
+from robustfd.colgen import ENGINES, price_and_branch
+from robustfd.components import graph_min_size, solve_components
+from robustfd.dag import from_edges
+from robustfd.graph_batch import is_batch, iter_batch, load_batch
+from robustfd.graph_io import read_blocks
+from robustfd.ilp import BUILDERS, LINEARIZATIONS, SYMMETRY, add_path_slot, has_solution, new_path_model, optimize, read_solution, set_active_slots, set_mip_start
+from robustfd.parallel import graph_result, worker_threads
+from robustfd.preprocess import contract_chains, expand_solution, safe_slots, same_flow
+from robustfd.size_search import STRATEGIES, search_minimum_size
+from robustfd.stats import STATS_FORMATS, close_stats, finish_stats, open_stats, record_solve, start_stats, timed_graphs, write_stats
+
 def get_edge(raw_edge):
 
     parts = raw_edge.split()
@@ -36,95 +51,65 @@ def get_graph(raw_graph):
 
 def read_input_graphs(graph_file):
 
-    graphs_raw = open(graph_file, 'r').read().split('#')[1:]
-    return [get_graph(raw_g) for raw_g in graphs_raw]
+    # graphs are parsed one at a time, as the solver asks for them
+    return (get_graph(raw_g) for raw_g in read_blocks(graph_file))
 
 def read_input(graph_file):
 
+    # binary batches (see robustfd.graph_batch) are memory-mapped instead of parsed
+    if is_batch(graph_file):
+        return iter_batch(load_batch(graph_file))
+
     return read_input_graphs(graph_file)
 
 
 def mfd_algorithm(data):
 
-    data['message'] = 'unsolved'
-    for i in range(2, len(data['graph'].edges) + 1):
-        if fd_fixed_size(data, i)['message'] == 'solved':
-            return data
+    intervals = {(u, v, i): (f, f) for ((u, v, i), f) in data['graph'].edge_data('flow')}
+    bounds = size_bounds(data, intervals, min_size=data['min size'])
+    if engine == 'colgen':
+        # when price_and_branch proves its decomposition optimal the bounds
+        # meet and the size search returns it as is; the ILP only searches a gap
+        bounds = price_and_branch(data, intervals, bounds, threads, min_size=data['min size'])
+    if safe_paths:
+        data = safe_slots(data, intervals)
 
-    return data
+    return search_minimum_size(data, fd_fixed_size, bounds['lower'], bounds['upper'], size_search, bounds['upper solution'])
 
 def build_base_ilp_model(data, size):
 
-    graph = data['graph']
-    max_flow_value = data['max_flow_value']
-    sources = data['sources']
-    sinks = data['sinks']
-
-    # create extra sets
-    T = [(u, v, i, k) for (u, v, i) in graph.edges(keys=True) for k in range(size)]
-    SC = list(range(size))
+    ilp = data.get('ilp')
+    if ilp is None:
+        ilp = data['ilp'] = new_path_model(data, threads, builder=builder, symmetry=symmetry, linearization=linearization)
+        model = ilp['model']
 
-    # Create a new model
-    model = gp.Model('MFD')
-    model.setParam('LogToConsole', 0)
-    model.setParam('Threads', threads)
+        # flow balance, extended with the z of every new slot
+        ilp['balance'] = {(u, v, i): model.addConstr(gp.LinExpr() == f) for ((u, v, i), f) in data['graph'].edge_data('flow')}
 
+    model = ilp['model']
+    while len(ilp['w']) < size:
+        k = add_path_slot(ilp, data)
+        for (u, v, i), row in ilp['balance'].items():
+            model.chgCoeff(row, ilp['z'][u, v, i, k], 1)
 
-    # Create variables
-    x = model.addVars(T, vtype=GRB.BINARY, name='x')
-    w = model.addVars(SC, vtype=GRB.INTEGER, name='w', lb=0)
-    z = model.addVars(T, vtype=GRB.CONTINUOUS, name='z', lb=0)
+    set_active_slots(ilp, size)
 
-    # flow conservation
-    for k in range(size):
-        for v in graph.nodes:
-            if v in sources:
-                model.addConstr(sum(x[v, w, i, k] for _, w, i in graph.out_edges(v, keys=True)) == 1)
-            if v in sinks:
-                model.addConstr(sum(x[u, v, i, k] for u, _, i in graph.in_edges(v, keys=True)) == 1)
-            if v not in sources and v not in sinks:
-                model.addConstr(sum(x[v, w, i, k] for _, w, i in graph.out_edges(v, keys=True)) - sum(x[u, v, i, k] for u, _, i in graph.in_edges(v, keys=True)) == 0)
-
-    # flow balance
-    for (u, v, i, f) in graph.edges(keys=True, data='flow'):
-        model.addConstr(f == sum(z[u, v, i, k] for k in range(size)))
-
-    # linearization
-    for (u, v, i) in graph.edges(keys=True):
-        for k in range(size):
-            model.addConstr(z[u, v, i, k] <= max_flow_value * x[u, v, i, k])
-            model.addConstr(w[k] - (1 - x[u, v, i, k]) * max_flow_value <= z[u, v, i, k])
-            model.addConstr(z[u, v, i, k] <= w[k])
-
-    return model, x, w, z
+    return model, ilp['x'], ilp['w'], ilp['z']
 
 
 def get_solution(model, data, size):
 
     data['weights'], data['solution'] = list(), list()
 
-    if model.status == GRB.OPTIMAL:
-        graph = data['graph']
-        T = [(u, v, i, k) for (u, v, i) in graph.edges(keys=True) for k in range(size)]
-
-        w_sol = [0] * len(range(size))
-        paths = [list() for _ in range(size)]
-        for k in range(size):
-            w_sol[k] = round(model.getVarByName(f'w[{k}]').x)
-        for (u, v, i, k) in T:
-            if round(model.getVarByName(f'x[{u},{v},{i},{k}]').x) == 1:
-                paths[k].append((u, v, i))
-        for k in range(len(paths)):
-            paths[k] = sorted(paths[k])
-
-        data['weights'], data['solution'] = w_sol, paths
+    if has_solution(model):
+        data['weights'], data['solution'] = read_solution(data['ilp'], data, size)
 
     return data
 
 
 def update_status(data, model):
 
-    if model.status == GRB.OPTIMAL:
+    if has_solution(model):
         data['message'] = 'solved'
         data['runtime'] = model.Runtime
 
@@ -132,6 +117,10 @@ def update_status(data, model):
         data['message'] = 'unsolved'
         data['runtime'] = 0
 
+    if model.status == GRB.TIME_LIMIT and model.SolCount == 0:
+        data['message'] = 'unsolved'
+        data['runtime'] = model.Runtime
+
 
     return data
 
@@ -141,10 +130,17 @@ def fd_fixed_size(data, size):
     # calculate a flow decomposition into size paths
     try:
         # Create a new model
+        start = time.perf_counter()
         model, _, _, _ = build_base_ilp_model(data, size)
+        build_time = time.perf_counter() - start
+
+        # warm start from a nearby decomposition
+        started = warm_start and set_mip_start(data['ilp'], data, data.get('start'))
 
         # objective function
-        model.optimize()
+        start = time.perf_counter()
+        optimize(model, data, started)
+        record_solve(data, size, build_time, time.perf_counter() - start, model)
 
         data = update_status(data, model)
         data = get_solution(model, data, size)
@@ -163,55 +159,118 @@ def output_paths(output,paths,weights):
 
 
     for nP in range(0,numberOfPaths):
-        nodes = set()
-        for (i,j,k) in paths[nP]:
-            nodes.add(i)
-            nodes.add(j)
+        # paths are edge sequences from the source, so consecutive edges share a vertex
+        nodes = [paths[nP][0][0]] + [j for (i,j,k) in paths[nP]]
         
         output.write(str(weights[nP]))
-        for i in sorted(nodes):
+        for i in nodes:
             output.write(' '.join(['',str(i)]))
         output.write(' \n')
 
 def compute_graph_metadata(graph):
 
-    # creation of NetworkX Graph
-    ngraph = nx.MultiDiGraph()
-    ngraph.add_weighted_edges_from(graph['edges'], weight='flow')
-
-    # calculating source, sinks
-    sources = [x for x in ngraph.nodes if ngraph.in_degree(x) == 0]
-    sinks = [x for x in ngraph.nodes if ngraph.out_degree(x) == 0]
+    # array-backed DAG, with its sources, sinks and topological order
+    dag = from_edges(graph['edges'])
 
     # definition of data
     return {
-        'graph': ngraph,
-        'sources': sources,
-        'sinks': sinks,
-        'max_flow_value': max(ngraph.edges(data='flow'), key=lambda e: e[-1])[-1] if len(ngraph.edges) > 0 else -1,
+        'graph': dag,
+        'sources': dag.sources,
+        'sinks': dag.sinks,
+        'max_flow_value': float(dag.attrs['flow'].max()) if len(dag.edges) > 0 else -1,
+        # no single path carries more than this attribute on an edge
+        'capacity': 'flow',
     }
 
+def solve_graph(graph):
+
+    if not graph['edges']:
+        return None
+
+    start = time.perf_counter()
+    mfd = compute_graph_metadata(graph)
+    mfd['min size'] = graph_min_size(graph)
+    mfd = set_time_budget(mfd, time_budget, size_time_budget)
+    if contract:
+        mfd = contract_chains(mfd, same_flow)
+    mfd = start_stats(mfd, graph, start)
+
+    if len(mfd['graph'].edges) > 0:
+
+        mfd = mfd_algorithm(mfd)
+        mfd = expand_solution(mfd)
+        mfd = finish_stats(mfd)
+        return graph_result(mfd)
+
+    return None
+
+
+def init_worker(settings):
+
+    globals().update(settings)
+
+
 def solve_instances(graphs,output_file):
 
     output = open(output_file, 'w+')
 
-    for g, graph in enumerate(graphs):
+    settings = {'threads': threads, 'warm_start': warm_start, 'builder': builder, 'symmetry': symmetry, 'linearization': linearization, 'contract': contract, 'safe_paths': safe_paths, 'engine': engine, 'size_search': size_search, 'time_budget': time_budget, 'size_time_budget': size_time_budget}
+    parameters = dict({key: value for key, value in settings.items() if key not in ('threads', 'time_budget', 'size_time_budget')}, formulation='exact')
+    cache = open_cache(cache_file, cache_size) if cache_file else None
+    stats = open_stats(output_file + '.stats', stats_format) if output_stats else None
+    tasks = cache_lookups(cache, timed_graphs(graphs), parameters)
+    results = solve_components(solve_graph, tasks, workers, init_worker, (settings,))
+
+    warm_starts = {'tried': 0, 'accepted': 0}
+    contraction = {'edges before': 0, 'edges after': 0}
+    presolve = {'paths fixed': 0, 'x fixed': 0}
+    columns = {'graphs': 0, 'columns': 0, 'iterations': 0, 'optimal': 0}
+    timed_out = 0
+    for g, (entry, hit, result) in enumerate(results):
         print("#graph ",g)
         output.write(f'# graph {g}\n')
 
-        if not graph['edges']:
-            continue
-
-        mfd = compute_graph_metadata(graph)
-
-        if len(mfd['graph'].edges) > 0:
-
-            mfd = mfd_algorithm(mfd)
-            paths,weights = mfd['solution'],mfd['weights']
+        if result is not None:
+            paths,weights = result['solution'],result['weights']
             output_paths(output,paths,weights)
-
+            for key, count in result.get('warm starts', {}).items():
+                warm_starts[key] += count
+            for key, count in result.get('contraction', {}).items():
+                contraction[key] += count
+            for key, count in result.get('presolve', {}).items():
+                presolve[key] += count
+            for key, count in result.get('colgen', {}).items():
+                columns[key] += count
+            if result.get('timed out'):
+                print('INFO: Time budget exceeded, reporting the best decomposition found')
+                timed_out += 1
+
+        if stats is not None:
+            write_stats(stats, g, result, hit)
+
+        # decompositions cut short by the time budget are not cached
+        if cache is not None and not hit and not (result and result.get('timed out')):
+            cache_store(cache, entry, result)
 
     output.close()
+    if stats is not None:
+        close_stats(stats)
+
+    if cache is not None:
+        close_cache(cache)
+        print(f"INFO: Cache hits {cache['hits']}, misses {cache['misses']}")
+
+    if timed_out:
+        print(f"INFO: {timed_out} graphs ran out of time")
+    if warm_start:
+        print(f"INFO: MIP start accepted in {warm_starts['accepted']} of {warm_starts['tried']} solves")
+    if contract and contraction['edges before'] > 0:
+        reduction = 100 * (1 - contraction['edges after'] / contraction['edges before'])
+        print(f"INFO: Chain contraction kept {contraction['edges after']} of {contraction['edges before']} edges ({reduction:.1f}% fewer x and z variables per path)")
+    if safe_paths:
+        print(f"INFO: Safe-path presolve assigned {presolve['paths fixed']} paths and fixed {presolve['x fixed']} x variables")
+    if engine == 'colgen':
+        print(f"INFO: Column generation proved {columns['optimal']} of {columns['graphs']} decompositions optimal without the path ILP ({columns['columns']} columns, {columns['iterations']} LP solves)")
 
 if __name__ == '__main__':
 
@@ -225,6 +284,36 @@ if __name__ == '__main__':
 
     parser.add_argument('-t', '--threads', type=int, default=0,
                         help='Number of threads to use for the Gurobi solver; use 0 for all threads (default 0).')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of worker processes solving graphs in parallel; use 0 for one per core (default 1).\nThe Gurobi threads are split among the workers.')
+    parser.add_argument('-ws', '--warm-start', action='store_true',
+                        help='Start each size from the decomposition found for a nearby size (or the greedy one).')
+    parser.add_argument('-b', '--builder', type=str, default='loop', choices=BUILDERS,
+                        help='How the ILP of each path is built (default loop):\n   loop (one constraint at a time),\n   matrix (sparse matrices with the Gurobi matrix API).')
+    parser.add_argument('-sb', '--symmetry-breaking', type=str, default='none', choices=SYMMETRY,
+                        help='How the interchangeable path slots are ordered (default none):\n   weights (non-increasing weights),\n   source (non-increasing rank of the first edge),\n   gurobi (Gurobi aggressive symmetry detection).')
+    parser.add_argument('-lin', '--linearization', type=str, default='tight', choices=LINEARIZATIONS,
+                        help='How z = x * w is linearized (default tight):\n   tight (a big-M per edge from the largest weight a path through it can carry),\n   global (the largest flow of the graph as big-M everywhere),\n   indicator (Gurobi indicator constraints).')
+    parser.add_argument('-c', '--contract', action='store_true',
+                        help='Contract chains of vertices with one in-edge and one out-edge before building the ILP.')
+    parser.add_argument('-sp', '--safe-paths', action='store_true',
+                        help='Assign the first path slots to edges that need a path of their own and fix the x variables this decides.')
+    parser.add_argument('--engine', type=str, default='ilp', choices=ENGINES,
+                        help='How the decomposition is found (default ilp):\n   ilp (path-slot ILP for every size between the flow and greedy bounds),\n   colgen (column generation over source-to-sink paths and price-and-branch:\n   the integer master decomposition is the answer when it meets the LP bound,\n   and the ILP only searches the sizes left between them otherwise).')
+    parser.add_argument('-ilptb', '--ilp-time-budget', type=float,
+                        help='Maximum time (in seconds) for all the ILP solves of one graph; when it runs out,\nthe best decomposition found so far is reported.')
+    parser.add_argument('-ilpsb', '--ilp-size-budget', type=float,
+                        help='Maximum time (in seconds) for the ILP solve of one number of paths; a size that\nruns out of time without a decomposition is treated as infeasible.')
+    parser.add_argument('-stats', '--output-stats', action='store_true',
+                        help='Output stats to file <output>.stats')
+    parser.add_argument('--stats-format', type=str, default='jsonl', choices=STATS_FORMATS,
+                        help='Format of the stats file (default jsonl):\n   jsonl (one object per graph, with a list of the sizes solved),\n   csv (one row per size solved).')
+    parser.add_argument('--cache', type=str,
+                        help='SQLite file caching solutions by graph and parameters; solved graphs found there are not solved again.')
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help='Maximum number of graphs kept in the cache; the least recently used are evicted (default 100000).')
+    parser.add_argument('-s', '--size-search', type=str, default='linear', choices=STRATEGIES,
+                        help='Strategy used to search for the minimum number of paths (default linear):\n   linear (try 2, 3, 4, ...),\n   galloping (try 2, 3, 5, 9, ... then bisect),\n   binary (bisect between the size bounds).')
  
     requiredNamed = parser.add_argument_group('required arguments')
     requiredNamed.add_argument('-i', '--input', type=str, help='Input filename', required=True)
@@ -235,5 +324,27 @@ if __name__ == '__main__':
     threads = args.threads
     if threads == 0:
         threads = os.cpu_count()
+    workers = args.workers
+    if workers == 0:
+        workers = os.cpu_count()
+    threads = worker_threads(threads, workers)
+    if workers > 1:
+        print(f'INFO: Using {workers} worker processes')
     print(f'INFO: Using {threads} threads for the Gurobi solver')
+
+    warm_start = args.warm_start
+    builder = args.builder
+    symmetry = args.symmetry_breaking
+    linearization = args.linearization
+    contract = args.contract
+    safe_paths = args.safe_paths
+    engine = args.engine
+    time_budget = args.ilp_time_budget
+    size_time_budget = args.ilp_size_budget
+    output_stats = args.output_stats
+    stats_format = args.stats_format
+    cache_file = args.cache
+    cache_size = args.cache_size
+
+    size_search = args.size_search
     solve_instances(read_input(args.input),args.output)
@@ -0,0 +1 @@
+# Shared helpers for the robust flow decomposition formulations.
@@ -0,0 +1,239 @@
+# Lower and upper bounds on the number of paths of a decomposition.
+#
+# The lower bound is the edge width of the DAG restricted to the edges that
+# must carry flow, computed as a minimum flow with lower bound 1 on those
+# edges. The upper bound comes from a greedy-width decomposition of an
+# integral flow that fits the edge intervals, so every size between the two
+# bounds is the only part of the search that needs the ILP.
+
+from math import ceil, floor
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import maximum_flow
+
+from robustfd.preprocess import original_edge_count
+
+
+def single_terminals(data):
+
+    # every path slot must use one out-edge of each source, so the models are
+    # only feasible with a single source and a single sink
+    if len(data['sources']) != 1 or len(data['sinks']) != 1:
+        return None
+    return data['sources'][0], data['sinks'][0]
+
+
+def integral_intervals(intervals):
+
+    return {e: (max(0, ceil(lo)), floor(hi)) for e, (lo, hi) in intervals.items()}
+
+
+def max_flow(arcs, n, source, sink):
+
+    # arcs are (tail, head, capacity) over vertices 0..n-1; returns the value
+    # and the flow on each arc, in the order given
+    if not arcs:
+        return 0, np.zeros(0, dtype=np.int64)
+    tails, heads, capacities = (np.asarray(column) for column in zip(*arcs))
+    network = sp.csr_array((capacities.astype(np.int32), (tails, heads)), shape=(n, n))
+    result = maximum_flow(network, source, sink)
+    return result.flow_value, np.asarray(result.flow[tails, heads]).ravel()
+
+
+def paths_through(graph, required, source, sink):
+
+    # a flow with one source-sink path through each required edge: the
+    # first edge reaching each vertex from the source, and the first edge
+    # leaving it towards the sink, give a path through any edge
+    reach = dict()
+    for v in graph.order:
+        for e in graph.out_edges(v):
+            reach.setdefault(e[1], e)
+    leave = dict()
+    for v in reversed(graph.order):
+        for e in graph.out_edges(v):
+            if e[1] == sink or e[1] in leave:
+                leave.setdefault(v, e)
+
+    flow = dict.fromkeys(graph.edges, 0)
+    for (u, v, i) in required:
+        flow[u, v, i] += 1
+        while u != source:
+            flow[reach[u]] += 1
+            u = reach[u][0]
+        while v != sink:
+            flow[leave[v]] += 1
+            v = leave[v][1]
+
+    return flow
+
+
+def edge_width(graph, required, source, sink):
+
+    # minimum flow with lower bound 1 on the required edges: start from a
+    # flow through every required edge and push back as much as possible
+    if not required:
+        return 0
+
+    flow = paths_through(graph, required, source, sink)
+    value = sum(flow[e] for e in graph.out_edges(source))
+
+    # every edge gets a middle vertex, so that pushing back along it (down to
+    # its lower bound) and forward along it (without limit) are separate arcs
+    n = len(graph.vertices)
+    position = graph.vertex_index
+    arcs = list()
+    for k, (u, v, i) in enumerate(graph.edges):
+        middle = n + k
+        back = flow[u, v, i] - 1 if (u, v, i) in required else flow[u, v, i]
+        arcs += [(position[u], middle, value), (middle, position[v], value), (position[v], middle, back), (middle, position[u], back)]
+
+    pushed, _ = max_flow(arcs, n + len(graph.edges), position[sink], position[source])
+    return value - pushed
+
+
+def feasible_flow(graph, intervals, source, sink):
+
+    # integral flow with intervals[e][0] <= f(e) <= intervals[e][1], or None
+    if any(lo > hi for lo, hi in intervals.values()):
+        return None
+
+    # vertices, then a middle vertex per edge, then the super source and sink
+    n = len(graph.vertices)
+    m = len(graph.edges)
+    position = graph.vertex_index
+    s_star, t_star = n + m, n + m + 1
+    excess = np.zeros(n, dtype=np.int64)
+    arcs = list()
+    for k, (u, v, i) in enumerate(graph.edges):
+        lo, hi = intervals[u, v, i]
+        arcs += [(position[u], n + k, hi - lo), (n + k, position[v], hi - lo)]
+        excess[position[v]] += lo
+        excess[position[u]] -= lo
+
+    demand = int(excess[excess > 0].sum())
+    if demand == 0:
+        return {e: intervals[e][0] for e in graph.edges}
+
+    arcs.append((position[sink], position[source], demand))
+    for p in np.flatnonzero(excess).tolist():
+        arcs.append((s_star, p, excess[p]) if excess[p] > 0 else (p, t_star, -excess[p]))
+
+    value, flows = max_flow(arcs, n + m + 2, s_star, t_star)
+    if value < demand:
+        return None
+
+    return {e: intervals[e][0] + int(flows[2 * k]) for k, e in enumerate(graph.edges)}
+
+
+def widest_path(graph, flow, source, sink):
+
+    # path from source to sink maximising the smallest remaining flow
+    width = {source: float('inf')}
+    parent = {}
+    for v in graph.order:
+        if v not in width:
+            continue
+        for _, w, i in graph.out_edges(v):
+            candidate = min(width[v], flow[v, w, i])
+            if candidate > 0 and candidate > width.get(w, 0):
+                width[w] = candidate
+                parent[w] = (v, w, i)
+
+    if sink not in parent:
+        return 0, list()
+
+    path = list()
+    v = sink
+    while v != source:
+        path.append(parent[v])
+        v = parent[v][0]
+
+    return width[sink], path[::-1]
+
+
+def greedy_decomposition(graph, flow, source, sink):
+
+    remaining = dict(flow)
+    weights, paths = list(), list()
+    while True:
+        weight, path = widest_path(graph, remaining, source, sink)
+        if weight == 0:
+            break
+        for e in path:
+            remaining[e] -= weight
+        weights.append(weight)
+        paths.append(path)
+
+    if any(remaining.values()):
+        return None
+
+    return weights, paths
+
+
+def any_path(graph, source, sink):
+
+    _, path = widest_path(graph, dict.fromkeys(graph.edges, 1), source, sink)
+    return path
+
+
+def pad_decomposition(graph, decomposition, source, sink, min_size, zero_weights=True):
+
+    # pad with empty paths, or split the heaviest path in two when weights
+    # must be positive, so that the solution is as large as the minimum size
+    weights, paths = decomposition
+    while len(paths) < min_size:
+        if zero_weights:
+            weights.append(0)
+            paths.append(paths[0] if paths else any_path(graph, source, sink))
+            continue
+        heaviest = max(range(len(paths)), key=lambda k: weights[k], default=None)
+        if heaviest is None or weights[heaviest] < 2:
+            return None
+        weights.append(weights[heaviest] // 2)
+        weights[heaviest] -= weights[-1]
+        paths.append(paths[heaviest])
+
+    return weights, paths
+
+
+def size_bounds(data, intervals, min_size=2, zero_weights=True):
+
+    # intervals maps every edge (u, v, i) to the range its total flow may take;
+    # 'upper solution' is a decomposition of size upper when one is known
+    graph = data['graph']
+    bounds = {
+        'lower': min_size,
+        'upper': original_edge_count(data),
+        'upper solution': None,
+    }
+
+    terminals = single_terminals(data)
+    if terminals is None:
+        return bounds
+    source, sink = terminals
+
+    intervals = integral_intervals(intervals)
+    required = {e for e, (lo, _) in intervals.items() if lo > 0}
+    bounds['lower'] = max(min_size, edge_width(graph, required, source, sink))
+
+    flow = feasible_flow(graph, intervals, source, sink)
+    if flow is None:
+        # no decomposition of any size: an empty range, for which the size
+        # search reports none without solving anything
+        bounds['lower'] = bounds['upper'] + 1
+        return bounds
+    decomposition = greedy_decomposition(graph, flow, source, sink)
+    if decomposition is None:
+        return bounds
+    decomposition = pad_decomposition(graph, decomposition, source, sink, min_size, zero_weights)
+    if decomposition is None:
+        return bounds
+    weights, paths = decomposition
+
+    if len(paths) <= bounds['upper']:
+        bounds['upper'] = len(paths)
+        bounds['upper solution'] = {'weights': weights, 'solution': paths}
+
+    return bounds
@@ -0,0 +1,37 @@
+# Time budgets for the ILP solves of one graph.
+#
+# A graph may be given a total budget (a deadline for all its solves,
+# counted from when its metadata is ready) and a budget for each size k.
+# Gurobi gets whichever limit is tighter as its TimeLimit; once the
+# deadline has passed the size search stops and keeps the best
+# decomposition found so far.
+
+import time
+
+
+class TimeoutILP(Exception):
+    pass
+
+
+def set_time_budget(data, graph_budget=None, size_budget=None):
+
+    data['deadline'] = time.monotonic() + graph_budget if graph_budget else None
+    data['size budget'] = size_budget or None
+    data['timed out'] = False
+
+    return data
+
+
+def time_left(data):
+
+    # seconds the next solve may take, or None when unlimited
+    limits = [data['size budget']] if data.get('size budget') else []
+    if data.get('deadline') is not None:
+        limits.append(max(0, data['deadline'] - time.monotonic()))
+
+    return min(limits) if limits else None
+
+
+def out_of_time(data):
+
+    return data.get('deadline') is not None and time.monotonic() >= data['deadline']
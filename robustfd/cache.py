@@ -0,0 +1,127 @@
+# On-disk cache of solved graphs, consulted before any model is built.
+#
+# Entries live in an SQLite table keyed by a hash of the canonical graph and
+# of the formulation parameters. The graph is canonicalised by replacing its
+# vertices with their rank, so graphs that only differ by an order-preserving
+# renumbering share an entry; cached paths are stored over ranks and mapped
+# back to the vertices of each graph. The least recently used entries are
+# evicted once the table holds more than max_entries.
+
+import json
+import sqlite3
+import hashlib
+
+
+def open_cache(filename, max_entries=100000):
+
+    connection = sqlite3.connect(filename)
+    connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, used INTEGER)')
+    connection.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+    entries, used = connection.execute('SELECT COUNT(*), COALESCE(MAX(used), 0) FROM results').fetchone()
+
+    return {
+        'connection': connection,
+        'max entries': max_entries,
+        'entries': entries,
+        'clock': used,
+        'hits': 0,
+        'misses': 0,
+        'pending': 0,
+    }
+
+
+def canonical_graph(graph):
+
+    # every list of edge tuples in the graph dict ('edges', 'lower flow', ...)
+    # contributes the values after (u, v) to the row of that edge
+    lists = [name for name in sorted(graph) if isinstance(graph[name], list)]
+    vertices = sorted({w for (u, v, *_) in graph['edges'] for w in (u, v)})
+    rank = {v: r for r, v in enumerate(vertices)}
+    rows = sorted(
+        [rank[edge[0]], rank[edge[1]]] + [value for name in lists for value in graph[name][e][2:]]
+        for e, edge in enumerate(graph['edges'])
+    )
+
+    return rows, vertices
+
+
+def cache_key(rows, parameters):
+
+    text = json.dumps({'graph': rows, 'parameters': parameters}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def cache_lookups(cache, graphs, parameters):
+
+    # yields (key, hit, result, graph); graphs are passed on for solving only on a miss
+    for graph in graphs:
+        if cache is None:
+            yield None, False, None, graph
+            continue
+
+        rows, vertices = canonical_graph(graph)
+        key = cache_key(rows, parameters)
+        row = cache['connection'].execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            cache['misses'] += 1
+            yield (key, vertices), False, None, graph
+            continue
+
+        cache['hits'] += 1
+        cache['clock'] += 1
+        cache['connection'].execute('UPDATE results SET used = ? WHERE key = ?', (cache['clock'], key))
+        yield (key, vertices), True, from_ranks(json.loads(row[0]), vertices), None
+
+
+def solve_task(solve_graph, task):
+
+    key, hit, result, graph = task
+    if not hit:
+        result = solve_graph(graph)
+
+    return key, hit, result
+
+
+def to_ranks(result, vertices):
+
+    if result is None:
+        return None
+
+    rank = {v: r for r, v in enumerate(vertices)}
+    paths = [[rank[path[0][0]]] + [rank[v] for (_, v, _) in path] for path in result['solution']]
+    return {'weights': result['weights'], 'paths': paths}
+
+
+def from_ranks(value, vertices):
+
+    if value is None:
+        return None
+
+    solution = [[(vertices[u], vertices[v], 0) for u, v in zip(path, path[1:])] for path in value['paths']]
+    return {'weights': value['weights'], 'solution': solution}
+
+
+def cache_store(cache, key, result):
+
+    key, vertices = key
+    connection = cache['connection']
+    cache['clock'] += 1
+    cursor = connection.execute('INSERT OR IGNORE INTO results VALUES (?, ?, ?)', (key, json.dumps(to_ranks(result, vertices)), cache['clock']))
+    cache['entries'] += cursor.rowcount
+
+    # evict the least recently used entries
+    if cache['entries'] > cache['max entries']:
+        excess = cache['entries'] - cache['max entries']
+        connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)', (excess,))
+        cache['entries'] = cache['max entries']
+
+    cache['pending'] += 1
+    if cache['pending'] >= 100:
+        connection.commit()
+        cache['pending'] = 0
+
+
+def close_cache(cache):
+
+    cache['connection'].commit()
+    cache['connection'].close()
@@ -0,0 +1,236 @@
+# Column generation over source-to-sink paths, for the exact and bounded models.
+#
+# The restricted master chooses how many copies of each column (a path P
+# with an integral weight w) to use, minimising their number, subject to the
+# flow of every edge lying in its interval [lower, upper]:
+#
+#     min sum(l[P, w])  s.t.  lower(e) <= sum(w * l[P, w] for P through e) <= upper(e)
+#
+# The pricing problem of its LP relaxation asks for a column with w * pi(P) > 1,
+# pi(P) being the sum of the edge duals along P. For a weight w no larger than
+# the smallest upper end of P, the best path is a longest path on the DAG with
+# the duals as edge lengths, restricted to the edges whose upper end is at
+# least w, so every distinct upper end is priced in turn. Once no column
+# prices out, the LP optimum rounded up is a lower bound on the number of
+# paths, and the master solved in integers over the columns generated
+# (price-and-branch) gives a decomposition. When it is as small as the
+# bound, it is the answer, proved optimal without the path-slot ILP; only
+# while a gap is left does the ILP search the sizes in between, with the
+# decomposition as its upper end. When the LP itself has no solution,
+# neither has the ILP for any number of paths.
+
+from math import ceil, floor
+
+import gurobipy as gp
+from gurobipy import GRB
+
+from robustfd.bounds import integral_intervals, pad_decomposition, single_terminals
+from robustfd.budget import out_of_time, time_left
+
+ENGINES = ('ilp', 'colgen')
+
+# reduced costs within this tolerance do not price out
+TOLERANCE = 1e-6
+
+
+def longest_path(graph, length, allowed, source, sink):
+
+    # path from source to sink over the allowed edges maximising the total length
+    best = {source: 0.0}
+    parent = dict()
+    for v in graph.order:
+        if v not in best:
+            continue
+        for e in graph.out_edges(v):
+            if not allowed[e]:
+                continue
+            candidate = best[v] + length[e]
+            if e[1] not in best or candidate > best[e[1]]:
+                best[e[1]] = candidate
+                parent[e[1]] = e
+
+    if sink not in parent:
+        return None, list()
+
+    path = list()
+    v = sink
+    while v != source:
+        path.append(parent[v])
+        v = parent[v][0]
+
+    return best[sink], path[::-1]
+
+
+def price(graph, duals, upper, source, sink, cost=1):
+
+    # the best column for each distinct upper end, if it prices out against
+    # its cost in the objective
+    columns = dict()
+    for threshold in sorted({floor(hi) for hi in upper.values() if hi >= 1}):
+        allowed = {e: upper[e] >= threshold for e in graph.edges}
+        value, path = longest_path(graph, duals, allowed, source, sink)
+        if value is None or value <= 0:
+            continue
+        weight = floor(min(upper[e] for e in path))
+        if weight * value > cost + TOLERANCE:
+            columns[tuple(path), weight] = weight * value
+
+    return list(columns)
+
+
+def new_master(graph, intervals, threads):
+
+    # one row per edge, or two when its flow ranges over an interval, and
+    # artificial columns, costlier than any decomposition, that keep the
+    # master feasible until enough paths are generated
+    model = gp.Model('colgen')
+    model.setParam('LogToConsole', 0)
+    model.setParam('Threads', threads)
+
+    penalty = len(graph.edges) + 1
+    rows = dict()
+    artificial = list()
+    for e in graph.edges:
+        lo, hi = intervals[e]
+        over = model.addVar(obj=penalty)
+        under = model.addVar(obj=penalty)
+        artificial += [over, under]
+        if lo == hi:
+            rows[e] = [model.addConstr(over - under == lo)]
+        else:
+            rows[e] = [model.addConstr(over - under >= lo), model.addConstr(over - under <= hi)]
+
+    return {'model': model, 'rows': rows, 'artificial': artificial, 'penalty': penalty, 'columns': dict()}
+
+
+def add_column(master, path, weight):
+
+    if (path, weight) in master['columns']:
+        return False
+
+    rows = [row for e in path for row in master['rows'][e]]
+    column = gp.Column([weight] * len(rows), rows)
+    master['columns'][path, weight] = master['model'].addVar(obj=1, column=column)
+
+    return True
+
+
+def master_decomposition(master):
+
+    # copies of a path add up to one path of their total weight
+    weights = dict()
+    for (path, weight), var in master['columns'].items():
+        copies = round(var.X)
+        if copies > 0:
+            weights[path] = weights.get(path, 0) + copies * weight
+
+    return list(weights.values()), [list(path) for path in weights]
+
+
+def generate_columns(master, data, upper, source, sink, cost, max_iterations):
+
+    # alternates master LP solves and pricing until no column prices out;
+    # returns whether it got there and the number of LP solves
+    model = master['model']
+    for iteration in range(1, max_iterations + 1):
+        if out_of_time(data):
+            return False, iteration - 1
+        model.optimize()
+        if model.Status != GRB.OPTIMAL:
+            return False, iteration
+        duals = {e: sum(row.Pi for row in rows) for e, rows in master['rows'].items()}
+        added = [add_column(master, path, weight) for path, weight in price(data['graph'], duals, upper, source, sink, cost)]
+        if not any(added):
+            return True, iteration
+
+    return False, max_iterations
+
+
+def set_phase(master, feasibility):
+
+    # the feasibility phase only minimises the artificial columns
+    for var in master['artificial']:
+        var.Obj = 1 if feasibility else master['penalty']
+    for var in master['columns'].values():
+        var.Obj = 0 if feasibility else 1
+
+
+def price_and_branch(data, intervals, bounds, threads, min_size=2, zero_weights=True, max_iterations=1000):
+
+    # bounds as from size_bounds, with 'upper solution' replaced by the
+    # decomposition found here; data['colgen'] records what was done, and
+    # whether the decomposition (or the lack of one) is proved optimal
+    graph = data['graph']
+    stats = data['colgen'] = {'graphs': 1, 'columns': 0, 'iterations': 0, 'optimal': 0}
+    terminals = single_terminals(data)
+    if terminals is None or bounds['lower'] >= bounds['upper']:
+        stats['optimal'] = int(bounds['lower'] >= bounds['upper'])
+        return bounds
+    source, sink = terminals
+
+    intervals = integral_intervals(intervals)
+    upper = {e: hi for e, (_, hi) in intervals.items()}
+    master = new_master(graph, intervals, threads)
+    model = master['model']
+
+    # the known decomposition is a feasible start
+    if bounds['upper solution'] is not None:
+        for path, weight in zip(bounds['upper solution']['solution'], bounds['upper solution']['weights']):
+            if weight > 0:
+                add_column(master, tuple(path), weight)
+
+    converged, iterations = generate_columns(master, data, upper, source, sink, 1, max_iterations)
+    artificial = converged and sum(var.X for var in master['artificial']) > TOLERANCE
+
+    # the penalty of the artificial columns may not be enough to drive them
+    # out: a feasibility phase either finds columns without them, or proves
+    # that no decomposition exists whatever the number of paths
+    infeasible = False
+    if artificial:
+        set_phase(master, True)
+        converged, more = generate_columns(master, data, upper, source, sink, 0, max_iterations - iterations)
+        iterations += more
+        infeasible = converged and model.ObjVal > TOLERANCE
+        set_phase(master, False)
+        if converged and not infeasible:
+            converged, more = generate_columns(master, data, upper, source, sink, 1, max_iterations - iterations)
+            iterations += more
+            artificial = converged and sum(var.X for var in master['artificial']) > TOLERANCE
+
+    stats['iterations'] = iterations
+
+    if infeasible:
+        # an empty range of sizes: the size search reports no decomposition
+        model.dispose()
+        bounds['lower'] = bounds['upper'] + 1
+        stats['columns'] = len(master['columns'])
+        stats['optimal'] = 1
+        return bounds
+
+    # the LP bound only holds for the full set of columns, and when the
+    # artificial columns are not needed
+    if converged and not artificial:
+        bounds['lower'] = max(bounds['lower'], ceil(model.ObjVal - TOLERANCE))
+
+    # the restricted master in integers, without the artificial columns; its
+    # decomposition is preferred to the greedy one of size_bounds unless larger
+    if not out_of_time(data):
+        for var in master['artificial']:
+            var.UB = 0
+        for var in master['columns'].values():
+            var.VType = GRB.INTEGER
+        limit = time_left(data)
+        model.setParam('TimeLimit', GRB.INFINITY if limit is None else limit)
+        model.optimize()
+        if model.SolCount > 0:
+            decomposition = pad_decomposition(graph, master_decomposition(master), source, sink, min_size, zero_weights)
+            if decomposition is not None and len(decomposition[1]) <= bounds['upper']:
+                weights, paths = decomposition
+                bounds['upper'] = len(paths)
+                bounds['upper solution'] = {'weights': weights, 'solution': paths}
+
+    model.dispose()
+    stats['columns'] = len(master['columns'])
+    stats['optimal'] = int(bounds['lower'] >= bounds['upper'])
+
+    return bounds
@@ -0,0 +1,127 @@
+# Splitting graphs into weakly connected components.
+#
+# No path crosses from one weakly connected component to another, so a
+# minimum decomposition of a graph is the union of minimum decompositions
+# of its components, and each component is a much smaller model. Every
+# component is solved as a graph of its own, in the worker pool when there
+# is one, and the results are merged back in the order of the components.
+# A component may need a single path, so components are solved with a
+# minimum of one path instead of the minimum of two of whole graphs; two or
+# more components with at least one path each always meet the latter.
+
+from collections import deque
+from functools import partial
+
+from robustfd.cache import solve_task
+from robustfd.parallel import solve_in_order
+
+# counters summed over the components
+COUNTERS = ('warm starts', 'contraction', 'presolve', 'colgen')
+
+# smallest number of paths of a decomposition of a whole graph
+MIN_SIZE = 2
+
+
+def component_labels(edges):
+
+    # union-find over the vertices of the (u, v, ...) edge tuples
+    parent = dict()
+
+    def find(v):
+        parent.setdefault(v, v)
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    for (u, v, *_) in edges:
+        parent[find(u)] = find(v)
+
+    return {v: find(v) for v in parent}
+
+
+def split_graph(graph):
+
+    # every list of edge tuples in the graph dict ('edges', 'lower flow', ...)
+    # is split by the component of its first vertex; components follow the
+    # order of their first edge
+    labels = component_labels(graph['edges'])
+    roots = list(dict.fromkeys(labels[u] for (u, *_) in graph['edges']))
+    if len(roots) <= 1:
+        return [graph]
+
+    return [
+        dict({name: [item for item in value if labels[item[0]] == root] if isinstance(value, list) else value for name, value in graph.items()}, **{'min size': 1})
+        for root in roots
+    ]
+
+
+def graph_min_size(graph):
+
+    return graph.get('min size', MIN_SIZE)
+
+
+def merge_results(results):
+
+    # a graph has a decomposition only if every component has one
+    if any(result is None or not result['weights'] for result in results):
+        weights, solution = list(), list()
+    else:
+        weights = [weight for result in results for weight in result['weights']]
+        solution = [path for result in results for path in result['solution']]
+
+    results = [result for result in results if result is not None]
+    merged = {
+        'weights': weights,
+        'solution': solution,
+        'timed out': any(result.get('timed out') for result in results),
+        'components': len(results),
+    }
+    for name in COUNTERS:
+        counts = [result[name] for result in results if name in result]
+        if counts:
+            merged[name] = {key: sum(count[key] for count in counts) for key in counts[0]}
+    if any('objective function' in result for result in results):
+        merged['objective function'] = sum(result.get('objective function', 0) for result in results)
+
+    # timings add up, as if the components were solved one after the other
+    stats = [result['stats'] for result in results if 'stats' in result]
+    if stats:
+        merged['stats'] = {
+            'parse time': stats[0]['parse time'],
+            'metadata time': sum(s['metadata time'] for s in stats),
+            'solves': [solve for s in stats for solve in s['solves']],
+            'total time': sum(s['total time'] for s in stats),
+        }
+
+    return merged
+
+
+def solve_graph_components(solve_graph, graph):
+
+    parts = split_graph(graph)
+    if len(parts) == 1:
+        return solve_graph(graph)
+
+    return merge_results([solve_graph(part) for part in parts])
+
+
+def solve_components(solve_graph, tasks, workers=1, initializer=None, initargs=()):
+
+    # tasks and results as for solve_task; the components of a graph become
+    # consecutive tasks, so that the pool solves them in parallel
+    counts = deque()
+
+    def component_tasks():
+        for key, hit, result, graph in tasks:
+            parts = [graph] if hit else split_graph(graph)
+            counts.append(len(parts))
+            for part in parts:
+                yield key, hit, result, part
+
+    results = solve_in_order(partial(solve_task, solve_graph), component_tasks(), workers, initializer, initargs)
+    for key, hit, result in results:
+        count = counts.popleft()
+        if count > 1:
+            result = merge_results([result] + [next(results)[2] for _ in range(count - 1)])
+        yield key, hit, result
@@ -0,0 +1,154 @@
+# Array-backed flow DAG shared by all formulations.
+#
+# Edges are kept as parallel NumPy arrays (tail, head, key and one array per
+# attribute) indexed by two CSR adjacency structures, so the sources, sinks
+# and a topological order are computed once, when the graph is built. Edges
+# are named by tuples (u, v, i) as in a networkx MultiDiGraph, i numbering
+# the parallel edges from u to v, which is how the ILP variables and the
+# solutions refer to them. Vertices are integers. networkx is only needed
+# to convert from and to its graphs.
+
+import numpy as np
+
+
+def edge_values(values):
+
+    # numeric attributes become arrays; anything else (e.g. lists of flows) stays a list
+    values = list(values)
+    if all(isinstance(value, (int, float, np.integer, np.floating)) for value in values):
+        return np.asarray(values, dtype=float)
+    return values
+
+
+def adjacency(positions, n):
+
+    # CSR: the edges at vertex p are order[offsets[p]:offsets[p + 1]]
+    order = np.argsort(positions, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(positions, minlength=n), out=offsets[1:])
+    return offsets, order
+
+
+def topological_order(n, out_offsets, out_order, head_positions):
+
+    in_degree = np.bincount(head_positions, minlength=n)
+    ready = np.flatnonzero(in_degree == 0).tolist()
+    order = list()
+    while ready:
+        p = ready.pop()
+        order.append(p)
+        for e in out_order[out_offsets[p]:out_offsets[p + 1]].tolist():
+            q = head_positions[e]
+            in_degree[q] -= 1
+            if in_degree[q] == 0:
+                ready.append(q)
+
+    if len(order) < n:
+        raise ValueError('the flow graph has a cycle')
+
+    return order
+
+
+class FlowDAG:
+
+    __slots__ = (
+        'tail', 'head', 'key', 'attrs', 'edges', 'edge_index', 'vertices', 'vertex_index',
+        'out_offsets', 'out_order', 'in_offsets', 'in_order', 'sources', 'sinks', 'order',
+    )
+
+    def __init__(self, tail, head, attrs=None):
+
+        self.tail = np.asarray(tail, dtype=np.int64)
+        self.head = np.asarray(head, dtype=np.int64)
+        self.attrs = {name: edge_values(values) for name, values in (attrs or {}).items()}
+
+        # parallel edges from u to v are numbered in the order they are given
+        count = dict()
+        keys = list()
+        for pair in zip(self.tail.tolist(), self.head.tolist()):
+            keys.append(count.get(pair, 0))
+            count[pair] = keys[-1] + 1
+        self.key = np.asarray(keys, dtype=np.int64)
+        self.edges = list(zip(self.tail.tolist(), self.head.tolist(), keys))
+        self.edge_index = {e: k for k, e in enumerate(self.edges)}
+
+        self.vertices = np.unique(np.concatenate([self.tail, self.head]))
+        self.vertex_index = {v: p for p, v in enumerate(self.vertices.tolist())}
+        n = len(self.vertices)
+        tail_positions = np.searchsorted(self.vertices, self.tail)
+        head_positions = np.searchsorted(self.vertices, self.head)
+        self.out_offsets, self.out_order = adjacency(tail_positions, n)
+        self.in_offsets, self.in_order = adjacency(head_positions, n)
+
+        self.sources = self.vertices[np.diff(self.in_offsets) == 0].tolist()
+        self.sinks = self.vertices[np.diff(self.out_offsets) == 0].tolist()
+        self.order = self.vertices[topological_order(n, self.out_offsets, self.out_order, head_positions)].tolist()
+
+    @property
+    def nodes(self):
+
+        return self.vertices.tolist()
+
+    def out_edges(self, v):
+
+        p = self.vertex_index[v]
+        return [self.edges[e] for e in self.out_order[self.out_offsets[p]:self.out_offsets[p + 1]].tolist()]
+
+    def in_edges(self, v):
+
+        p = self.vertex_index[v]
+        return [self.edges[e] for e in self.in_order[self.in_offsets[p]:self.in_offsets[p + 1]].tolist()]
+
+    def out_degree(self, v):
+
+        p = self.vertex_index[v]
+        return int(self.out_offsets[p + 1] - self.out_offsets[p])
+
+    def in_degree(self, v):
+
+        p = self.vertex_index[v]
+        return int(self.in_offsets[p + 1] - self.in_offsets[p])
+
+    def values(self, name):
+
+        # the attribute of every edge as Python values, None where it is not set
+        values = self.attrs.get(name)
+        if values is None:
+            return [None] * len(self.edges)
+        return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+    def edge_data(self, name):
+
+        return zip(self.edges, self.values(name))
+
+    def edge_attrs(self, e):
+
+        k = self.edge_index[e]
+        return {name: values[k].item() if isinstance(values, np.ndarray) else values[k] for name, values in self.attrs.items()}
+
+
+def from_edges(edges):
+
+    # edges as in get_graph: (u, v, flow) tuples
+    tail, head, flow = zip(*edges) if edges else ((), (), ())
+    return FlowDAG(tail, head, {'flow': flow})
+
+
+def to_networkx(dag):
+
+    import networkx as nx
+
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from(dag.nodes)
+    for e in dag.edges:
+        graph.add_edge(e[0], e[1], key=e[2], **dag.edge_attrs(e))
+
+    return graph
+
+
+def from_networkx(graph):
+
+    edges = list(graph.edges(keys=True, data=True))
+    names = {name for (_, _, _, attrs) in edges for name in attrs}
+    attrs = {name: [data.get(name) for (_, _, _, data) in edges] for name in names}
+    return FlowDAG([u for (u, _, _, _) in edges], [v for (_, v, _, _) in edges], attrs)
@@ -0,0 +1,143 @@
+# Compact binary batches of graphs or path solutions.
+#
+# A batch is a directory of .npy arrays in CSR style, so that every array can
+# be memory-mapped and graph i is found in O(1) from the offsets:
+#
+#   graphs: offsets (graphs + 1, into edges), n (vertices per graph),
+#           u, v, flow per edge, plus lower and upper for inexact inputs
+#   paths:  offsets (graphs + 1, into paths), path_offsets (paths + 1, into
+#           vertices), weights per path, vertices
+#
+# python -m robustfd.graph_batch -i input.graph -o input.batch [-p]
+
+import os
+import argparse
+from array import array
+
+import numpy as np
+
+from robustfd.graph_io import read_blocks, read_path
+
+
+def is_batch(path):
+
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'offsets.npy'))
+
+
+def load_batch(path):
+
+    return {name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r') for name in os.listdir(path) if name.endswith('.npy')}
+
+
+def save_batch(path, arrays):
+
+    os.makedirs(path, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), values)
+
+
+def batch_size(batch):
+
+    return len(batch['offsets']) - 1
+
+
+def convert_graphs(graph_file, batch_path):
+
+    # edges with four columns (u v lower upper) are inexact inputs
+    offsets, n = array('q', [0]), array('q')
+    u, v, flow, lower, upper = array('q'), array('q'), array('d'), array('d'), array('d')
+    for raw_graph in read_blocks(graph_file):
+        lines = [line for line in raw_graph.split('\n')[1:] if line.strip()]
+        n.append(int(lines[0]) if lines else 0)
+        for line in lines[1:]:
+            parts = line.split()
+            u.append(int(parts[0]))
+            v.append(int(parts[1]))
+            if len(parts) > 3:
+                lower.append(float(parts[2]))
+                upper.append(float(parts[3]))
+                flow.append((float(parts[2]) + float(parts[3])) / 2)
+            else:
+                flow.append(float(parts[2]))
+        offsets.append(len(u))
+
+    arrays = {'offsets': offsets, 'n': n, 'u': u, 'v': v, 'flow': flow}
+    if len(lower) > 0:
+        arrays['lower'], arrays['upper'] = lower, upper
+    save_batch(batch_path, {name: np.frombuffer(values, dtype=values.typecode) for name, values in arrays.items()})
+
+
+def convert_paths(path_file, batch_path):
+
+    offsets, path_offsets = array('q', [0]), array('q', [0])
+    weights, vertices = array('d'), array('q')
+    for raw_paths in read_blocks(path_file):
+        for line in raw_paths.split('\n')[1:]:
+            if not line.strip():
+                continue
+            weight, path = read_path(line)
+            weights.append(weight)
+            vertices.extend(path)
+            path_offsets.append(len(vertices))
+        offsets.append(len(weights))
+
+    arrays = {'offsets': offsets, 'path_offsets': path_offsets, 'weights': weights, 'vertices': vertices}
+    save_batch(batch_path, {name: np.frombuffer(values, dtype=values.typecode) for name, values in arrays.items()})
+
+
+def batch_graph(batch, i):
+
+    # graph i in the format of get_graph; the slices are views of the mapped files
+    start, end = batch['offsets'][i], batch['offsets'][i + 1]
+    u, v, flow = batch['u'][start:end].tolist(), batch['v'][start:end].tolist(), batch['flow'][start:end].tolist()
+    graph = {
+        'n': int(batch['n'][i]),
+        'edges': list(zip(u, v, flow)),
+    }
+    if 'lower' in batch:
+        graph['lower flow'] = list(zip(u, v, batch['lower'][start:end].tolist()))
+        graph['upper flow'] = list(zip(u, v, batch['upper'][start:end].tolist()))
+
+    return graph
+
+
+def batch_paths(batch, i):
+
+    # paths of graph i as (weight, vertices) pairs; integral weights become ints
+    start, end = batch['offsets'][i], batch['offsets'][i + 1]
+    path_offsets = batch['path_offsets']
+    paths = list()
+    for p in range(start, end):
+        weight = float(batch['weights'][p])
+        vertices = batch['vertices'][path_offsets[p]:path_offsets[p + 1]].tolist()
+        paths.append((int(weight) if weight.is_integer() else weight, vertices))
+
+    return paths
+
+
+def iter_batch(batch, read=batch_graph):
+
+    for i in range(batch_size(batch)):
+        yield read(batch, i)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='''
+        Converts a file of graphs (or of paths, with -p) to a binary batch that can be memory-mapped.
+        ''',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-p', '--paths', action='store_true', help='The input holds weighted paths (ground truth or solutions) instead of graphs')
+
+    requiredNamed = parser.add_argument_group('required arguments')
+    requiredNamed.add_argument('-i', '--input', type=str, help='Input filename', required=True)
+    requiredNamed.add_argument('-o', '--output', type=str, help='Output batch directory', required=True)
+
+    args = parser.parse_args()
+
+    if args.paths:
+        convert_paths(args.input, args.output)
+    else:
+        convert_graphs(args.input, args.output)
@@ -0,0 +1,28 @@
+# Streaming access to files of '#'-separated blocks (graphs, paths, metrics).
+
+
+def read_blocks(filename):
+
+    # yields the text of one block at a time, starting with its '#' line, so
+    # that memory is bounded by the largest block instead of the whole file
+    with open(filename, 'r') as f:
+        block = None
+        for line in f:
+            if line.startswith('#'):
+                if block is not None:
+                    yield ''.join(block)
+                block = [line]
+            elif block is not None:
+                block.append(line)
+        if block is not None:
+            yield ''.join(block)
+
+
+def read_path(line):
+
+    # a line of a paths file (ground truth or solution): the weight, then the
+    # vertices in order, separated by any run of spaces, trailing ones included;
+    # integral weights become ints
+    parts = line.split()
+    weight = float(parts[0])
+    return int(weight) if weight.is_integer() else weight, [int(vertex) for vertex in parts[1:]]
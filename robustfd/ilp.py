@@ -0,0 +1,397 @@
+# Path-slot ILP models that persist across sizes.
+#
+# A model holds path slots 0, 1, 2, ... with their x, w and z variables, the
+# flow conservation rows and the linearization of z = x * w. Moving to a
+# larger size only adds the columns and rows of the new slots; moving to a
+# smaller size switches the extra slots off by setting the right-hand side
+# of their source and sink rows to 0, which forces all their x (and z) to 0.
+#
+# The slots are interchangeable, so a model of size k has k! copies of each
+# solution. Symmetry breaking orders consecutive slots, which keeps one copy:
+# 'weights' by non-increasing weight, 'source' by non-increasing rank of the
+# source edge a path starts with (an inactive slot uses no edge, so its rank
+# of 0 comes last), and 'gurobi' leaves it to Gurobi's aggressive symmetry
+# detection (orbital fixing). Slots assigned to an edge by the safe-path
+# presolve (data['safe slots']) are no longer interchangeable and are left
+# out of the ordering.
+#
+# The linearization needs a big-M on every z and w. 'tight' uses, for each
+# edge, the largest weight a single path through it can carry: the attribute
+# named by data['capacity'] (the exact flow, or the upper end of its range),
+# capped by the largest flow, and bounds every w by the largest capacity
+# leaving a source and entering a sink. Formulations without a per-edge
+# capacity (least squares, path errors) use the largest flow, as 'global'
+# does everywhere. 'indicator' replaces the big-M rows by Gurobi indicator
+# constraints on binary x.
+
+import numpy as np
+import scipy.sparse as sp
+import gurobipy as gp
+from gurobipy import GRB
+
+from robustfd.budget import time_left
+
+BUILDERS = ('loop', 'matrix')
+SYMMETRY = ('none', 'weights', 'source', 'gurobi')
+LINEARIZATIONS = ('tight', 'global', 'indicator')
+
+
+def new_path_model(data, threads, name='MFD', builder='loop', symmetry='none', linearization='tight'):
+
+    model = gp.Model(name)
+    model.setParam('LogToConsole', 0)
+    model.setParam('Threads', threads)
+    if symmetry == 'gurobi':
+        model.setParam('Symmetry', 2)
+
+    return {
+        'model': model,
+        'size': 0,
+        'x': gp.tupledict(),
+        'w': gp.tupledict(),
+        'z': gp.tupledict(),
+        'terminal rows': list(),
+        'x slots': list(),
+        'builder': builder,
+        'symmetry': symmetry,
+        'linearization': linearization,
+    }
+
+
+def weight_bounds(ilp, data):
+
+    # big-M of every edge, in the order of graph.edges, and of every w
+    if 'bounds' not in ilp:
+        graph = data['graph']
+        max_flow_value = float(data['max_flow_value'])
+        capacity = data.get('capacity')
+        if ilp['linearization'] == 'global' or capacity is None:
+            caps = np.full(len(graph.edges), max_flow_value)
+        else:
+            caps = np.minimum(np.asarray(graph.values(capacity), dtype=float), max_flow_value)
+        leaving = np.isin(graph.tail, data['sources'])
+        entering = np.isin(graph.head, data['sinks'])
+        ilp['bounds'] = caps, float(min(caps[leaving].max(), caps[entering].max()))
+
+    return ilp['bounds']
+
+
+def linearize(model, x, w, z, cap, bound, indicator):
+
+    # z = x * w, with cap >= z and bound >= w
+    if indicator:
+        model.addConstr((x == 0) >> (z <= 0))
+        model.addConstr((x == 1) >> (z >= w))
+    else:
+        model.addConstr(z <= cap * x)
+        model.addConstr(w - (1 - x) * bound <= z)
+    model.addConstr(z <= w)
+
+
+def add_path_slot(ilp, data, w_lb=0, x_vtype=GRB.BINARY):
+
+    if ilp['builder'] == 'matrix':
+        k = add_path_slot_matrix(ilp, data, w_lb, x_vtype)
+    else:
+        k = add_path_slot_loop(ilp, data, w_lb, x_vtype)
+    fix_safe_slot(ilp, data, k)
+    order_slots(ilp, data, k)
+
+    return k
+
+
+def source_rank(ilp, data, k):
+
+    # 1 + the position of the source edge used by slot k, or 0 if it is inactive
+    source_edges = data['graph'].out_edges(data['sources'][0])
+    return gp.quicksum((j + 1) * ilp['x'][e + (k,)] for j, e in enumerate(source_edges))
+
+
+def fix_safe_slot(ilp, data, k):
+
+    # the first slots follow the paths assigned by the safe-path presolve
+    safe = data.get('safe slots', list())
+    if k >= len(safe):
+        return
+
+    x = ilp['x']
+    for e in safe[k]['forced']:
+        x[e + (k,)].LB = 1
+    for e in safe[k]['excluded']:
+        x[e + (k,)].UB = 0
+
+
+def order_slots(ilp, data, k):
+
+    # slot k may not come before slot k - 1 in the symmetry-breaking order;
+    # slots fixed by the presolve are not interchangeable
+    if k <= len(data.get('safe slots', list())) or ilp['symmetry'] not in ('weights', 'source'):
+        return
+
+    model = ilp['model']
+    if ilp['symmetry'] == 'weights':
+        model.addConstr(ilp['w'][k - 1] >= ilp['w'][k])
+    else:
+        model.addConstr(source_rank(ilp, data, k - 1) >= source_rank(ilp, data, k))
+
+
+def add_path_slot_loop(ilp, data, w_lb=0, x_vtype=GRB.BINARY):
+
+    model = ilp['model']
+    graph = data['graph']
+    sources = data['sources']
+    sinks = data['sinks']
+    caps, bound = weight_bounds(ilp, data)
+    k = len(ilp['terminal rows'])
+
+    # create variables of the new slot
+    T = [(u, v, i, k) for (u, v, i) in graph.edges]
+    x = model.addVars(T, vtype=x_vtype, name='x')
+    w = model.addVar(vtype=GRB.INTEGER, name=f'w[{k}]', lb=w_lb, ub=GRB.INFINITY if ilp['linearization'] == 'global' else bound)
+    z = model.addVars(T, vtype=GRB.CONTINUOUS, name='z', lb=0)
+
+    # flow conservation
+    terminal_rows = list()
+    for v in graph.nodes:
+        if v in sources:
+            terminal_rows.append(model.addConstr(gp.quicksum(x[v, u, i, k] for _, u, i in graph.out_edges(v)) == 1))
+        if v in sinks:
+            terminal_rows.append(model.addConstr(gp.quicksum(x[u, v, i, k] for u, _, i in graph.in_edges(v)) == 1))
+        if v not in sources and v not in sinks:
+            model.addConstr(gp.quicksum(x[v, u, i, k] for _, u, i in graph.out_edges(v)) - gp.quicksum(x[u, v, i, k] for u, _, i in graph.in_edges(v)) == 0)
+
+    # linearization (indicators need binary x)
+    indicator = ilp['linearization'] == 'indicator' and x_vtype == GRB.BINARY
+    for (u, v, i), cap in zip(graph.edges, caps.tolist()):
+        linearize(model, x[u, v, i, k], w, z[u, v, i, k], cap, bound, indicator)
+
+    ilp['x'].update(x)
+    ilp['x slots'].append([x[u, v, i, k] for (u, v, i) in graph.edges])
+    ilp['w'][k] = w
+    ilp['z'].update(z)
+    ilp['terminal rows'].append(terminal_rows)
+
+    return k
+
+
+def slot_matrices(ilp, data):
+
+    # constraint blocks of one slot over the variables [x, z, w], shared by
+    # every slot of the graph: flow conservation (C v = c) and the
+    # linearization of z = x * w (L v <= l)
+    graph = data['graph']
+    caps, bound = weight_bounds(ilp, data)
+    edges = list(graph.edges)
+    nodes = graph.nodes
+    n_edges = len(edges)
+
+    # one conservation row per vertex, read off the edge arrays
+    tail = np.searchsorted(graph.vertices, graph.tail)
+    head = np.searchsorted(graph.vertices, graph.head)
+    is_source = np.isin(graph.vertices, data['sources'])
+    is_sink = np.isin(graph.vertices, data['sinks'])
+    leaving = np.flatnonzero(~is_sink[tail])
+    entering = np.flatnonzero(~is_source[head])
+    rows = np.concatenate([tail[leaving], head[entering]])
+    cols = np.concatenate([leaving, entering])
+    coefs = np.concatenate([np.ones(len(leaving)), np.where(is_sink[head[entering]], 1.0, -1.0)])
+    C = sp.csr_matrix((coefs, (rows, cols)), shape=(len(nodes), 2 * n_edges + 1))
+    c = (is_source | is_sink).astype(float)
+
+    I = sp.identity(n_edges, format='csr')
+    O = sp.csr_matrix((n_edges, n_edges))
+    ones = sp.csr_matrix(np.ones((n_edges, 1)))
+    L = sp.vstack([
+        sp.hstack([-sp.diags(caps, format='csr'), I, 0 * ones]),
+        sp.hstack([bound * I, -I, ones]),
+        sp.hstack([O, I, -ones]),
+    ], format='csr')
+    l = np.concatenate([np.zeros(n_edges), np.full(n_edges, bound), np.zeros(n_edges)])
+
+    terminal = np.flatnonzero(is_source | is_sink).tolist()
+
+    return {'edges': edges, 'C': C, 'c': c, 'L': L, 'l': l, 'terminal': terminal}
+
+
+def add_path_slot_matrix(ilp, data, w_lb=0, x_vtype=GRB.BINARY):
+
+    model = ilp['model']
+    if 'matrices' not in ilp:
+        ilp['matrices'] = slot_matrices(ilp, data)
+    matrices = ilp['matrices']
+    edges = matrices['edges']
+    n_edges = len(edges)
+    k = len(ilp['terminal rows'])
+
+    # one vector [x, z, w] per slot
+    names = [f'x[{u},{v},{i},{k}]' for (u, v, i) in edges] + [f'z[{u},{v},{i},{k}]' for (u, v, i) in edges] + [f'w[{k}]']
+    vtype = np.array([x_vtype] * n_edges + [GRB.CONTINUOUS] * n_edges + [GRB.INTEGER])
+    lb = np.zeros(2 * n_edges + 1)
+    lb[-1] = w_lb
+    ub = np.full(2 * n_edges + 1, GRB.INFINITY)
+    if ilp['linearization'] != 'global':
+        ub[-1] = ilp['bounds'][1]
+    slot = model.addMVar(2 * n_edges + 1, vtype=vtype, lb=lb, ub=ub, name=names)
+
+    # flow conservation and linearization; indicators (on binary x) replace
+    # the two big-M blocks of L
+    conservation = model.addMConstr(matrices['C'], slot, '=', matrices['c']).tolist()
+    variables = slot.tolist()
+    if ilp['linearization'] == 'indicator' and x_vtype == GRB.BINARY:
+        model.addMConstr(matrices['L'][2 * n_edges:], slot, '<', matrices['l'][2 * n_edges:])
+        for e in range(n_edges):
+            model.addConstr((variables[e] == 0) >> (variables[n_edges + e] <= 0))
+            model.addConstr((variables[e] == 1) >> (variables[n_edges + e] >= variables[-1]))
+    else:
+        model.addMConstr(matrices['L'], slot, '<', matrices['l'])
+
+    ilp['x'].update((e + (k,), var) for e, var in zip(edges, variables[:n_edges]))
+    ilp['z'].update((e + (k,), var) for e, var in zip(edges, variables[n_edges:2 * n_edges]))
+    ilp['x slots'].append(variables[:n_edges])
+    ilp['w'][k] = variables[-1]
+    ilp['terminal rows'].append([conservation[r] for r in matrices['terminal']])
+
+    return k
+
+
+def walk_path(edges, source):
+
+    # order the edges of a path by following it from its source
+    out_edge = {u: (u, v, i) for (u, v, i) in edges}
+    path = list()
+    v = source
+    while v in out_edge and len(path) < len(edges):
+        path.append(out_edge[v])
+        v = out_edge[v][1]
+
+    return path if len(path) == len(edges) else sorted(edges)
+
+
+def read_solution(ilp, data, size):
+
+    # one bulk read of the x and w values of the active slots
+    model = ilp['model']
+    edges = list(data['graph'].edges)
+    x_sol = model.getAttr('X', [var for k in range(size) for var in ilp['x slots'][k]])
+    w_sol = [round(value) for value in model.getAttr('X', [ilp['w'][k] for k in range(size)])]
+
+    paths = list()
+    for k in range(size):
+        values = x_sol[k * len(edges):(k + 1) * len(edges)]
+        selected = [e for e, value in zip(edges, values) if round(value) == 1]
+        heads = {v for (_, v, _) in selected}
+        sources = [u for (u, _, _) in selected if u not in heads]
+        paths.append(walk_path(selected, sources[0]) if sources else selected)
+
+    return w_sol, paths
+
+
+def set_active_slots(ilp, size):
+
+    for k, rows in enumerate(ilp['terminal rows']):
+        for row in rows:
+            row.RHS = 1 if k < size else 0
+    ilp['size'] = size
+
+
+def ordered_start(ilp, data, paths, weights):
+
+    # a start must follow the symmetry-breaking order of the slots to be feasible
+    if ilp['symmetry'] == 'weights' and weights is not None:
+        order = sorted(range(len(paths)), key=lambda k: -weights[k])
+    elif ilp['symmetry'] == 'source':
+        rank = {e: j for j, e in enumerate(data['graph'].out_edges(data['sources'][0]))}
+        order = sorted(range(len(paths)), key=lambda k: -rank.get(paths[k][0], -1) if paths[k] else 1)
+    else:
+        order = list(range(len(paths)))
+
+    # and give the slots fixed by the presolve a path through their edge; if
+    # one has none, the start stops there and Gurobi completes the rest
+    placed = list()
+    for slot in data.get('safe slots', list()):
+        through = [k for k in order if slot['edge'] in paths[k]]
+        if not through:
+            order = list()
+            break
+        placed.append(through[0])
+        order.remove(through[0])
+    order = placed + order
+
+    return [paths[k] for k in order], None if weights is None else [weights[k] for k in order]
+
+
+def set_mip_start(ilp, data, start):
+
+    # start is (paths, weights) with paths as lists of edges (u, v, i); slots
+    # beyond the given paths, and w and z when weights is None, are left for
+    # Gurobi to complete. Returns whether a start was set at all.
+    x, w, z = ilp['x'], ilp['w'], ilp['z']
+    edges = list(data['graph'].edges)
+    paths, weights = start if start is not None else (list(), None)
+    paths, weights = ordered_start(ilp, data, paths, weights)
+
+    variables, values = list(), list()
+    for k in range(len(w)):
+        if k < min(len(paths), ilp['size']):
+            on = set(paths[k])
+            for e in edges:
+                variables += [x[e + (k,)], z[e + (k,)]]
+                if weights is None:
+                    values += [1 if e in on else 0, GRB.UNDEFINED]
+                else:
+                    values += [1, weights[k]] if e in on else [0, 0]
+            variables.append(w[k])
+            values.append(GRB.UNDEFINED if weights is None else weights[k])
+        else:
+            for e in edges:
+                variables += [x[e + (k,)], z[e + (k,)]]
+                values += [GRB.UNDEFINED, GRB.UNDEFINED] if k < ilp['size'] else [0, 0]
+            variables.append(w[k])
+            values.append(GRB.UNDEFINED)
+
+    ilp['model'].setAttr('Start', variables, values)
+
+    return len(paths) > 0
+
+
+def has_solution(model):
+
+    # a solve stopped by its time limit still has a feasible incumbent to report
+    return model.status == GRB.OPTIMAL or (model.status == GRB.TIME_LIMIT and model.SolCount > 0)
+
+
+def timed_out(model, data, limit):
+
+    # the limit was what was left of the graph budget, or the size budget
+    # left the size undecided (no decomposition and no proof that there is
+    # none); a size stopped by its own budget with an incumbent is solved
+    deadline = limit != data.get('size budget')
+    return model.status == GRB.TIME_LIMIT and (deadline or model.SolCount == 0)
+
+
+def optimize(model, data, started=False):
+
+    # the model is reused across sizes, so the limit is set before every solve
+    limit = time_left(data)
+    model.setParam('TimeLimit', GRB.INFINITY if limit is None else limit)
+
+    # without a MIP start there is nothing to count
+    if not started:
+        model.optimize()
+        data['timed out'] = data.get('timed out', False) or timed_out(model, data, limit)
+        return
+
+    accepted = list()
+
+    def callback(model, where):
+        if where == GRB.Callback.MESSAGE:
+            message = model.cbGet(GRB.Callback.MSG_STRING)
+            if message.startswith(('Loaded user MIP start', 'User MIP start produced')):
+                accepted.append(message)
+
+    model.optimize(callback)
+    data['timed out'] = data.get('timed out', False) or timed_out(model, data, limit)
+
+    counts = data.setdefault('warm starts', {'tried': 0, 'accepted': 0})
+    counts['tried'] += 1
+    counts['accepted'] += 1 if accepted else 0
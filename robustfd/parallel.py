@@ -0,0 +1,36 @@
+# Solving the independent graphs of an input file in a pool of processes.
+
+from collections import deque
+from multiprocessing import Pool
+
+
+def worker_threads(threads, workers):
+
+    # split the Gurobi thread budget so that workers x threads <= threads
+    return max(1, threads // max(1, workers))
+
+
+def solve_in_order(solve_graph, graphs, workers=1, initializer=None, initargs=(), window=4):
+
+    # results are yielded in the order of graphs, whatever order they finish
+    # in; at most window graphs per worker are read ahead of the output
+    if workers <= 1:
+        for graph in graphs:
+            yield solve_graph(graph)
+        return
+
+    with Pool(workers, initializer, initargs) as pool:
+        pending = deque()
+        for graph in graphs:
+            pending.append(pool.apply_async(solve_graph, (graph,)))
+            if len(pending) >= window * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def graph_result(data):
+
+    # what a worker sends back: everything but the graph, the Gurobi model and
+    # the slot fixings and minimum size it was built with
+    return {key: value for key, value in data.items() if key not in ('graph', 'ilp', 'safe slots', 'min size')}
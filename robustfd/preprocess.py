@@ -0,0 +1,172 @@
+# Graph preprocessing applied after compute_graph_metadata.
+#
+# A vertex with a single in-edge and a single out-edge forces every path
+# through the in-edge to continue on the out-edge, so a chain of such
+# vertices can be replaced by one edge without changing the decompositions.
+# How the attributes of the chain edges merge depends on the formulation.
+#
+# The safe-path presolve assigns path slots to edges that need a path of
+# their own, and fixes the x variables of those slots that the assignment
+# decides.
+
+from robustfd.dag import FlowDAG
+
+
+def same_flow(chain):
+
+    # exact flows: the chain only admits a decomposition if all flows agree
+    flows = {attrs['flow'] for attrs in chain}
+    if len(flows) > 1:
+        return None
+    return {'flow': flows.pop()}
+
+
+def intersect_intervals(chain):
+
+    # every edge of the chain carries the same total flow, which must lie in
+    # all the [lower, upper] intervals of the chain
+    return {
+        'flow': chain[0]['flow'],
+        'lower': max(attrs['lower'] for attrs in chain),
+        'upper': min(attrs['upper'] for attrs in chain),
+    }
+
+
+def collect_flows(chain):
+
+    # least squares sums the squared error of every original edge
+    return {
+        'flow': chain[0]['flow'],
+        'flows': [f for attrs in chain for f in attrs.get('flows') or [attrs['flow']]],
+    }
+
+
+def chains(graph, sources, sinks):
+
+    def unitary(v):
+        return v not in sources and v not in sinks and graph.in_degree(v) == 1 and graph.out_degree(v) == 1
+
+    # follow every edge leaving a non-unitary vertex through unitary vertices
+    for u in graph.nodes:
+        if unitary(u):
+            continue
+        for edge in graph.out_edges(u):
+            chain = [edge]
+            while unitary(chain[-1][1]):
+                chain.append(graph.out_edges(chain[-1][1])[0])
+            if len(chain) > 1:
+                yield chain
+
+
+def contract_chains(data, combine):
+
+    # data['expansion'] maps each new edge to the original edges it replaces;
+    # the contracted graph keeps the other edges in order and appends one
+    # edge per chain
+    graph = data['graph']
+    expansion = data.setdefault('expansion', dict())
+    edges_before = len(graph.edges)
+
+    kept = dict.fromkeys(graph.edges, True)
+    contracted = list()
+    for chain in list(chains(graph, set(data['sources']), set(data['sinks']))):
+        attrs = combine([graph.edge_attrs(e) for e in chain])
+        if attrs is None:
+            continue
+        for e in chain:
+            kept[e] = False
+        contracted.append((chain[0][0], chain[-1][1], attrs, [original for e in chain for original in expansion.pop(e, [e])]))
+
+    if contracted:
+        names = set(graph.attrs) | {name for (_, _, attrs, _) in contracted for name in attrs}
+        keep = [kept[e] for e in graph.edges]
+        tail = graph.tail[keep].tolist() + [u for (u, _, _, _) in contracted]
+        head = graph.head[keep].tolist() + [v for (_, v, _, _) in contracted]
+        attrs = {
+            name: [value for value, k in zip(graph.values(name), keep) if k] + [attrs.get(name) for (_, _, attrs, _) in contracted]
+            for name in names
+        }
+        old_edges = [e for e in graph.edges if kept[e]]
+        graph = data['graph'] = FlowDAG(tail, head, attrs)
+
+        # a kept edge is renumbered if a parallel edge before it was removed
+        for old, new in zip(old_edges, graph.edges):
+            if old != new:
+                expansion[new] = expansion.pop(old, [old])
+        for new, (_, _, _, originals) in zip(graph.edges[len(old_edges):], contracted):
+            expansion[new] = originals
+
+    data['contraction'] = {'edges before': edges_before, 'edges after': len(graph.edges)}
+
+    return data
+
+
+def safe_slots(data, intervals):
+
+    # intervals maps every edge to the range of its total flow, as for
+    # size_bounds. Edges with a positive lower end carry flow in every
+    # decomposition, and no path goes through two edges of an antichain of
+    # them, so each needs a path of its own: the slots being interchangeable,
+    # slot j can be the one through the j-th edge. That path also takes the
+    # edges forced by in- and out-degree 1 around it, and none of the edges
+    # it cannot reach or be reached from.
+    graph = data['graph']
+    position = graph.vertex_index
+
+    # reach[v] (reached[v]): bit set of the vertices reachable from v (that
+    # reach v), v included
+    reach, reached = dict(), dict()
+    for v in reversed(graph.order):
+        bits = 1 << position[v]
+        for (_, u, _) in graph.out_edges(v):
+            bits |= reach[u]
+        reach[v] = bits
+    for v in graph.order:
+        bits = 1 << position[v]
+        for (u, _, _) in graph.in_edges(v):
+            bits |= reached[u]
+        reached[v] = bits
+
+    def comparable(e, f):
+        return e == f or reach[e[1]] >> position[f[0]] & 1 or reach[f[1]] >> position[e[0]] & 1
+
+    # greedy antichain, starting from the required edges comparable with the
+    # fewest vertices
+    required = [e for e in graph.edges if intervals[e][0] > 0]
+    antichain = list()
+    for e in sorted(required, key=lambda e: reach[e[1]].bit_count() + reached[e[0]].bit_count()):
+        if not any(comparable(e, f) for f in antichain):
+            antichain.append(e)
+
+    slots = list()
+    for e in antichain:
+        forced = [e]
+        v = e[1]
+        while graph.out_degree(v) == 1:
+            forced.append(graph.out_edges(v)[0])
+            v = forced[-1][1]
+        v = e[0]
+        while graph.in_degree(v) == 1:
+            forced.append(graph.in_edges(v)[0])
+            v = forced[-1][0]
+        excluded = [f for f in graph.edges if not comparable(e, f)]
+        slots.append({'edge': e, 'forced': forced, 'excluded': excluded})
+
+    data['safe slots'] = slots
+    data['presolve'] = {'paths fixed': len(slots), 'x fixed': sum(len(slot['forced']) + len(slot['excluded']) for slot in slots)}
+
+    return data
+
+
+def original_edge_count(data):
+
+    # sizes are searched up to the number of edges of the input graph
+    return data.get('contraction', {}).get('edges before', len(data['graph'].edges))
+
+
+def expand_solution(data):
+
+    expansion = data.get('expansion', dict())
+    data['solution'] = [[original for e in path for original in expansion.get(e, [e])] for path in data.get('solution', list())]
+
+    return data
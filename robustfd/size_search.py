@@ -0,0 +1,138 @@
+# Strategies for finding the minimum number of paths k.
+#
+# Every formulation solves a fixed-size model for one k at a time; these
+# strategies decide which sizes get solved. 'galloping' and 'binary' assume
+# that feasibility is monotone in k (true whenever path weights may be 0);
+# for models with positive weights every size below the one they find is
+# checked as well, so that the result is still the minimum.
+# A size whose solve runs out of time without an incumbent counts as
+# infeasible; once the time budget of the graph is spent the search stops.
+
+from robustfd.budget import TimeoutILP, out_of_time
+
+STRATEGIES = ('linear', 'galloping', 'binary')
+
+
+def linear_search(solve, lower, upper):
+
+    for size in range(lower, upper + 1):
+        if solve(size):
+            return size
+
+    return None
+
+
+def bisect_search(solve, lower, upper):
+
+    # smallest feasible size in [lower, upper], given that upper is feasible
+    while lower < upper:
+        middle = (lower + upper) // 2
+        if solve(middle):
+            upper = middle
+        else:
+            lower = middle + 1
+
+    return upper
+
+
+def galloping_search(solve, lower, upper):
+
+    # probe lower, lower + 1, lower + 3, lower + 7, ... until a size is feasible
+    last_infeasible = lower - 1
+    step = 1
+    size = lower
+    while size <= upper:
+        if solve(size):
+            return bisect_search(solve, last_infeasible + 1, size)
+        last_infeasible = size
+        size = lower + 2 * step - 1
+        step *= 2
+
+    if last_infeasible < upper and solve(upper):
+        return bisect_search(solve, last_infeasible + 1, upper)
+
+    return None
+
+
+def binary_search(solve, lower, upper, upper_feasible=False):
+
+    if lower > upper:
+        return None
+    if not upper_feasible and not solve(upper):
+        return None
+
+    return bisect_search(solve, lower, upper)
+
+
+def nearest_start(solutions, size):
+
+    # the largest solved size below size gives a complete start (the extra
+    # slots are completed by the solver); otherwise the heaviest paths of the
+    # smallest solved size above it fix only the x variables
+    smaller = [k for k, solution in solutions.items() if solution is not None and k < size]
+    if smaller:
+        solution = solutions[max(smaller)]
+        return solution['solution'], solution['weights']
+
+    larger = [k for k, solution in solutions.items() if solution is not None and k > size]
+    if larger:
+        solution = solutions[min(larger)]
+        heaviest = sorted(range(len(solution['weights'])), key=lambda k: -solution['weights'][k])[:size]
+        return [solution['solution'][k] for k in heaviest], None
+
+    return None
+
+
+def search_minimum_size(data, fd_fixed_size, lower, upper, strategy='linear', upper_solution=None, monotone=True):
+
+    # solutions found for every feasible size, so that bisection can go back;
+    # a known decomposition of size upper (e.g. from a heuristic) is never re-solved
+    solutions = {}
+    if upper_solution is not None:
+        solutions[upper] = upper_solution
+
+    def solve(size):
+        if size in solutions:
+            return solutions[size] is not None
+        if out_of_time(data):
+            raise TimeoutILP()
+        data['message'] = 'unsolved'
+        data['start'] = nearest_start(solutions, size)
+        if fd_fixed_size(data, size)['message'] == 'solved':
+            solutions[size] = {key: data.get(key) for key in ('weights', 'solution', 'objective function', 'runtime')}
+        else:
+            solutions[size] = None
+        return solutions[size] is not None
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f'unknown size search strategy: {strategy}')
+
+    try:
+        if strategy == 'linear':
+            size = linear_search(solve, lower, upper)
+        elif strategy == 'galloping':
+            size = galloping_search(solve, lower, upper)
+        else:
+            size = binary_search(solve, lower, upper, upper_solution is not None)
+        if not monotone and strategy != 'linear':
+            # a size skipped as infeasible may not be: check every size up to
+            # the one found (all of them if none was), reusing those solved
+            size = linear_search(solve, lower, upper if size is None else size)
+    except TimeoutILP:
+        # out of time: keep the smallest decomposition found so far
+        data['timed out'] = True
+        feasible = [k for k, solution in solutions.items() if solution is not None]
+        size = min(feasible) if feasible else None
+
+    data['sizes tried'] = sorted(k for k in solutions if k != upper or upper_solution is None)
+    if size is None:
+        data['message'] = 'unsolved'
+        data['weights'], data['solution'] = list(), list()
+        return data
+
+    data['message'] = 'solved'
+    for key, value in solutions[size].items():
+        if value is not None:
+            data[key] = value
+
+    return data
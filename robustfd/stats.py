@@ -0,0 +1,110 @@
+# Per-graph statistics, written next to the output file with -stats.
+#
+# Every graph records the wall time spent parsing it and computing its
+# metadata, and for each size solved the time to build and optimize the
+# model, its dimensions, the nodes explored, the MIP gap and the status.
+# Only counters already kept by Gurobi are read, so the overhead is a few
+# attribute reads per solve. JSON Lines gives one object per graph; CSV
+# gives one row per solve, with the graph columns repeated.
+
+import csv
+import json
+import time
+from gurobipy import GRB
+
+STATS_FORMATS = ('jsonl', 'csv')
+GRAPH_FIELDS = ('graph', 'cache hit', 'parse time', 'metadata time', 'total time', 'k', 'timed out', 'sizes tried')
+SOLVE_FIELDS = ('size', 'build time', 'optimize time', 'variables', 'constraints', 'nodes', 'mip gap', 'status')
+STATUSES = {GRB.OPTIMAL: 'optimal', GRB.INFEASIBLE: 'infeasible', GRB.TIME_LIMIT: 'time limit'}
+
+
+def timed_graphs(graphs):
+
+    # parsing is lazy, so it is timed around each step of the reader
+    graphs = iter(graphs)
+    while True:
+        start = time.perf_counter()
+        graph = next(graphs, None)
+        if graph is None:
+            return
+        graph['parse time'] = time.perf_counter() - start
+        yield graph
+
+
+def start_stats(data, graph, start):
+
+    # start is when solve_graph began working on the graph
+    data['stats'] = {
+        'parse time': graph.get('parse time'),
+        'metadata time': time.perf_counter() - start,
+        'start': start,
+        'solves': list(),
+    }
+
+    return data
+
+
+def record_solve(data, size, build_time, optimize_time, model):
+
+    data['stats']['solves'].append({
+        'size': size,
+        'build time': build_time,
+        'optimize time': optimize_time,
+        'variables': model.NumVars,
+        'constraints': model.NumConstrs,
+        'nodes': int(model.NodeCount),
+        'mip gap': model.MIPGap if model.SolCount > 0 else None,
+        'status': STATUSES.get(model.Status, model.Status),
+    })
+
+
+def finish_stats(data):
+
+    data['stats']['total time'] = time.perf_counter() - data['stats'].pop('start')
+
+    return data
+
+
+def open_stats(filename, format='jsonl'):
+
+    file = open(filename, 'w', newline='')
+    writer = None
+    if format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(GRAPH_FIELDS + SOLVE_FIELDS)
+
+    return {'file': file, 'format': format, 'writer': writer}
+
+
+def write_stats(stats, g, result, hit=False):
+
+    # results from the cache (or graphs without edges) carry no timings
+    graph_stats = (result or {}).get('stats', {})
+    solves = graph_stats.get('solves', [])
+    row = {
+        'graph': g,
+        'cache hit': hit,
+        'parse time': graph_stats.get('parse time'),
+        'metadata time': graph_stats.get('metadata time'),
+        'total time': graph_stats.get('total time'),
+        'k': len(result['weights']) if result else 0,
+        'timed out': bool(result and result.get('timed out')),
+        'sizes tried': [solve['size'] for solve in solves],
+    }
+
+    if stats['format'] == 'jsonl':
+        row['solves'] = solves
+        if result and 'colgen' in result:
+            row['colgen'] = result['colgen']
+        stats['file'].write(json.dumps(row) + '\n')
+        return
+
+    row['sizes tried'] = ' '.join(map(str, row['sizes tried']))
+    graph_values = [row[field] for field in GRAPH_FIELDS]
+    for solve in solves or [{}]:
+        stats['writer'].writerow(graph_values + [solve.get(field) for field in SOLVE_FIELDS])
+
+
+def close_stats(stats):
+
+    stats['file'].close()
@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'previous_formulation'))
+import mdf_standard
+from benchmarks.formulations import layered_instance
+from robustfd.components import solve_graph_components
+
+SETTINGS = {
+    'threads': 1,
+    'warm_start': False,
+    'builder': 'loop',
+    'symmetry': 'none',
+    'linearization': 'tight',
+    'contract': False,
+    'safe_paths': False,
+    'engine': 'ilp',
+    'size_search': 'linear',
+    'time_budget': None,
+    'size_time_budget': None,
+}
+
+
+def join(*graphs):
+
+    # disjoint union, renumbering the vertices of each graph after the previous ones
+    joined, offset = {'n': 0, 'edges': list()}, 0
+    for graph in graphs:
+        joined['edges'] += [(u + offset, v + offset, f) for u, v, f in graph['edges']]
+        offset += graph['n']
+    joined['n'] = offset
+
+    return joined
+
+
+def test_chains_need_one_path_each():
+
+    mdf_standard.init_worker(SETTINGS)
+    chains = {'n': 6, 'edges': [(0, 1, 5), (1, 2, 5), (3, 4, 7), (4, 5, 7)]}
+    result = solve_graph_components(mdf_standard.solve_graph, chains)
+
+    assert result['weights'] == [5, 7]
+
+
+def test_split_and_unsplit_sizes_agree():
+
+    # each connected graph is solved whole; their union is split into them
+    mdf_standard.init_worker(SETTINGS)
+    rng = random.Random(0)
+    graphs = [layered_instance(10, 2, paths, 0.5, rng)['exact'] for paths in (2, 3, 4)]
+    sizes = [len(mdf_standard.solve_graph(graph)['weights']) for graph in graphs]
+    result = solve_graph_components(mdf_standard.solve_graph, join(*graphs))
+
+    assert len(result['weights']) == sum(sizes)
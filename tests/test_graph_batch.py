@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import evaluation_metric
+from robustfd.graph_batch import convert_paths
+
+# solutions end their lines with a space, the data generator separates
+# vertices with two; a file may also end without a newline
+PATHS = '# graph 0\n5 0 1 2 \n7  0  3  2\n# graph 1\n2.5 4 5 6\n3 4 6'
+
+
+def test_paths_round_trip(tmp_path):
+
+    text = tmp_path / 'paths.txt'
+    text.write_text(PATHS)
+    batch = tmp_path / 'paths.batch'
+    convert_paths(str(text), str(batch))
+
+    from_text = list(evaluation_metric.read_graph_solution(str(text)))
+    from_batch = list(evaluation_metric.read_graph_solution(str(batch)))
+
+    assert from_text == from_batch
+    assert [graph['paths'] for graph in from_text] == [[[0, 1, 2], [0, 3, 2]], [[4, 5, 6], [4, 6]]]
+    assert [graph['weights'] for graph in from_text] == [[5, 7], [2.5, 3]]